@@ -1,6 +1,6 @@
 from flask import Flask, render_template, request, abort, g
 from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
+from flask_login import LoginManager, current_user
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
@@ -18,15 +18,19 @@ def get_real_ip():
             return request.headers.getlist("X-Forwarded-For")[0]
         return request.remote_addr
 
+def get_user_or_ip():
+    """Rate limit key of the logged-in user, so colleagues behind one NAT don't share a budget"""
+    if current_user.is_authenticated:
+        return f"user:{current_user.get_id()}"
+    return get_real_ip()
+
 # Initialize extensions
 db = SQLAlchemy()
 login_manager = LoginManager()
 migrate = Migrate()
 csrf = CSRFProtect()
-limiter = Limiter(
-    key_func=get_real_ip,
-    default_limits=["100 per hour"]
-)
+# Default limit and storage come from RATELIMIT_DEFAULT and RATELIMIT_STORAGE_URI
+limiter = Limiter(key_func=get_real_ip)
 
 # Setup logging with sensitive data masking
 class SensitiveDataFilter(logging.Filter):
@@ -64,13 +68,6 @@ def create_app(config=None):
     else:
         app.config.from_object(config)
 
-    # Initialize Flask-Limiter with Redis
-    limiter = Limiter(
-        key_func=get_real_ip, 
-        storage_uri="redis://localhost:6379"
-    )
-    limiter.init_app(app)  # This applies rate limiting to the Flask app
-
     # Set the SERVER_NAME to your domain
     app.config['SERVER_NAME'] = 'pataro.hilmifawwaz.xyz'
 
@@ -79,13 +76,27 @@ def create_app(config=None):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
+    # The module-level limiter, so @limiter.limit on routes takes effect; stored in Redis
     limiter.init_app(app)
+
+    from app.services.cache import dashboard_cache
+    from app.services.events import event_broker
+    from app.services.sites import site_catalog
+    from app.services.photos import photo_pipeline
+    from app.services.ticket_numbers import ticket_numbers
+    dashboard_cache.init_app(app)
+    event_broker.init_app(app)
+    site_catalog.init_app(app)
+    photo_pipeline.init_app(app)
+    ticket_numbers.init_app(app)
     
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = "Please log in to access this page."
     login_manager.login_message_category = "warning"
     login_manager.session_protection = "strong"
+    # API clients get a 401 instead of a redirect to the login page
+    login_manager.blueprint_login_views = {'api': None}
 
     # Ensure upload directory exists with secure permissions
     os.makedirs(app.config['UPLOAD_FOLDER'], mode=0o750, exist_ok=True)
@@ -100,8 +111,14 @@ def create_app(config=None):
     # Register blueprints
     from app.routes.main import bp as main_bp
     from app.routes.auth import bp as auth_bp
+    from app.routes.api import bp as api_bp
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(api_bp)
+
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
 
     # Error handlers
     @app.errorhandler(401)
@@ -128,8 +145,10 @@ def create_app(config=None):
 
     @app.before_request
     def log_request_info():
-        app.logger.debug('Headers: %s', request.headers)
-        app.logger.debug('Body: %s', request.get_data())
+        # Never touch the body here: get_data() would buffer every upload in memory
+        if app.logger.isEnabledFor(logging.DEBUG):
+            app.logger.debug('Headers: %s', request.headers)
+            app.logger.debug('Body: %s bytes of %s', request.content_length, request.mimetype)
     
     @app.before_request
     def block_bad_user_agents():
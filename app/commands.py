@@ -0,0 +1,48 @@
+import click
+from flask.cli import with_appcontext
+from flask import current_app
+from app.services import photo_store, rollup, uploads
+from app.services.photos import photo_pipeline
+
+
+@click.command('rebuild-daily-stats')
+@with_appcontext
+def rebuild_daily_stats():
+    """Rebuild the ticket_daily_stats rollup from the full ticket history."""
+    rows = rollup.rebuild()
+    click.echo(f"Rebuilt ticket_daily_stats with {rows} rows")
+
+
+@click.command('process-photos')
+@with_appcontext
+def process_photos():
+    """Make thumbnail and display variants for photos that have none yet."""
+    count = photo_pipeline.process_pending()
+    click.echo(f"Processed {count} photos")
+
+
+@click.command('migrate-photos')
+@with_appcontext
+def migrate_photos():
+    """Move photos stored under their upload names into the content-addressed store."""
+    moved, missing = photo_store.migrate_legacy()
+    click.echo(f"Moved {moved} photos into the store")
+    for photo_path in missing:
+        click.echo(f"Missing file for {photo_path}", err=True)
+    if moved:
+        click.echo("Run `flask process-photos` to make their thumbnails again")
+
+
+@click.command('gc-uploads')
+@with_appcontext
+def gc_uploads():
+    """Remove unfinished photo uploads older than PHOTO_UPLOAD_EXPIRY_HOURS."""
+    removed = uploads.collect_garbage(current_app.config['PHOTO_UPLOAD_EXPIRY_HOURS'] * 3600)
+    click.echo(f"Removed {removed} stale upload files")
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_daily_stats)
+    app.cli.add_command(process_photos)
+    app.cli.add_command(migrate_photos)
+    app.cli.add_command(gc_uploads)
@@ -3,6 +3,8 @@ from datetime import datetime
 from enum import Enum
 import pytz
 from flask_login import UserMixin
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from werkzeug.security import generate_password_hash
 import re
 
@@ -94,9 +96,33 @@ class Ticket(db.Model):
     resolved_at = db.Column(db.DateTime)  # New field for resolved timestamp
     closed_at = db.Column(db.DateTime)
 
+    # Jakarta calendar date of created_at, maintained by the database
+    local_date = db.Column(db.Date, db.Computed(
+        "(created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Jakarta')::date", persisted=True
+    ))
+
+    # Full-text search document, maintained by the database
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(
+        "setweight(to_tsvector('simple', coalesce(ticket_number, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')", persisted=True
+    )))
+
     # Relationships
     actions = db.relationship('TicketAction', backref='ticket', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_tickets_local_date_status', 'local_date', 'status'),
+        db.Index('ix_tickets_site_id_status', 'site_id', 'status'),
+        db.Index('ix_tickets_assigned_to_enom_status', 'assigned_to_enom', 'status'),
+        db.Index('ix_tickets_created_at_id', 'created_at', 'id'),
+        db.Index('ix_tickets_search_vector', 'search_vector', postgresql_using='gin'),
+        # Partial ticket numbers and creators are matched with ILIKE
+        db.Index('ix_tickets_ticket_number_trgm', 'ticket_number',
+                 postgresql_using='gin', postgresql_ops={'ticket_number': 'gin_trgm_ops'}),
+        db.Index('ix_tickets_created_by_trgm', 'created_by',
+                 postgresql_using='gin', postgresql_ops={'created_by': 'gin_trgm_ops'}),
+    )
+
     @property
     def created_at_jakarta(self):
         jakarta_tz = pytz.timezone('Asia/Jakarta')
@@ -118,6 +144,28 @@ class Ticket(db.Model):
             return self.resolved_at.astimezone(jakarta_tz)
         return None
 
+class TicketDailyStat(db.Model):
+    __tablename__ = 'ticket_daily_stats'
+
+    # Rollup of tickets by the Jakarta date they were created on. Dimensions
+    # hold enum names; an unassigned ticket is stored with assigned_to_enom ''.
+    stat_date = db.Column(db.Date, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('sites.id'), primary_key=True)
+    problem_category = db.Column(db.String(20), primary_key=True)
+    assigned_to_enom = db.Column(db.String(20), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+
+    ticket_count = db.Column(db.Integer, nullable=False, default=0)
+    closed_count = db.Column(db.Integer, nullable=False, default=0)
+    closed_seconds = db.Column(db.Float, nullable=False, default=0)  # Sum of closed_at - created_at
+
+class TicketNumberCounter(db.Model):
+    __tablename__ = 'ticket_number_counters'
+
+    # Highest ticket number handed out to any worker for a Jakarta date
+    day = db.Column(db.Date, primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
 class TicketAction(db.Model):
     __tablename__ = 'ticket_actions'
 
@@ -125,6 +173,21 @@ class TicketAction(db.Model):
     ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
     action_text = db.Column(db.Text, nullable=False)
     photo_path = db.Column(db.String(255))  # Path to stored photo
+    # Content hash of the photo; actions sharing a photo share its stored file
+    photo_sha256 = db.Column(db.String(64), index=True)
+    # Downscaled, metadata-free variants written by the photo pipeline
+    thumb_path = db.Column(db.String(255))
+    display_path = db.Column(db.String(255))
+
+    # Full-text search document, maintained by the database
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(
+        "to_tsvector('simple', coalesce(action_text, ''))", persisted=True
+    )))
+
+    __table_args__ = (
+        db.Index('ix_ticket_actions_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_ticket_actions_ticket_id_created_at_id', 'ticket_id', 'created_at', 'id'),
+    )
     
     # Keep existing field for backward compatibility
     created_by = db.Column(db.String(100), nullable=False)
@@ -180,7 +243,17 @@ class PlannedSite(db.Model):
     assignee = db.Column(db.String(100))  # New field for assignee
     updated_actions = db.Column(db.Text, default='Not Done Yet')  # New field for updated actions
 
+    # Full-text search document, maintained by the database
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(
+        "setweight(to_tsvector('simple', coalesce(planned_actions, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(updated_actions, '')), 'B')", persisted=True
+    )))
+
     site = db.relationship('Site', backref='planned_sites', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_planned_sites_search_vector', 'search_vector', postgresql_using='gin'),
+    )
     
 class PlanComment(db.Model):
     __tablename__ = 'plan_comments'
@@ -195,4 +268,10 @@ class PlanComment(db.Model):
     @property
     def created_at_jakarta(self):
         jakarta_tz = pytz.timezone('Asia/Jakarta')
-        return self.created_at.astimezone(jakarta_tz) if self.created_at else None
\ No newline at end of file
+        return self.created_at.astimezone(jakarta_tz) if self.created_at else None
+
+# The trigram indexes on tickets need pg_trgm before create_all() builds them
+event.listen(
+    Ticket.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
@@ -0,0 +1,329 @@
+import heapq
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from flask import Blueprint, Response, abort, request
+from flask_login import current_user, login_required
+from werkzeug.exceptions import HTTPException
+from app import db, limiter, get_user_or_ip
+from app.models import DailyPlan, PlannedSite, Site, Ticket, TicketAction, User
+from app.routes.main import (
+    filtered_plan_query, filtered_ticket_query, plans_scoped_to_current_user, scoped_to_current_user
+)
+from app.services.pagination import keyset_paginate
+from app.services.sites import site_catalog
+from app.services.tz import to_utc
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when installed
+    msgpack = None
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+# Integrations page through whole lists and poll, so each user gets a budget of their own
+limiter.limit("1200 per hour", key_func=get_user_or_ip)(bp)
+
+JSON = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+TICKET_FIELDS = {
+    'id': Ticket.id,
+    'ticket_number': Ticket.ticket_number,
+    'site_id': Ticket.site_id,
+    'site_code': Site.site_id,
+    'site_name': Site.name,
+    'problem_category': Ticket.problem_category,
+    'status': Ticket.status,
+    'description': Ticket.description,
+    'created_by': Ticket.created_by,
+    'assigned_to_enom': Ticket.assigned_to_enom,
+    'assigned_to_ts': Ticket.assigned_to_ts,
+    'assigned_to_id': Ticket.assigned_to_id,
+    'created_at': Ticket.created_at,
+    'updated_at': Ticket.updated_at,
+    'resolved_at': Ticket.resolved_at,
+    'closed_at': Ticket.closed_at,
+}
+
+ACTION_FIELDS = {
+    'id': TicketAction.id,
+    'ticket_id': TicketAction.ticket_id,
+    'action_text': TicketAction.action_text,
+    'photo_path': TicketAction.photo_path,
+    'thumb_path': TicketAction.thumb_path,
+    'display_path': TicketAction.display_path,
+    'created_by': TicketAction.created_by,
+    'user': User.username,
+    'created_at': TicketAction.created_at,
+}
+
+PLAN_FIELDS = {
+    'id': DailyPlan.id,
+    'plan_date': DailyPlan.plan_date,
+    'status': DailyPlan.status,
+    'enom_user_id': DailyPlan.enom_user_id,
+    'enom_user': User.username,
+    'created_at': DailyPlan.created_at,
+    'updated_at': DailyPlan.updated_at,
+    # Planned sites are loaded with one extra query for the whole page
+    'sites': None,
+}
+
+PLANNED_SITE_COLUMNS = (
+    PlannedSite.daily_plan_id,
+    PlannedSite.site_id,
+    Site.site_id.label('site_code'),
+    Site.name.label('site_name'),
+    PlannedSite.visit_order,
+    PlannedSite.planned_actions,
+    PlannedSite.updated_actions,
+    PlannedSite.assignee,
+    PlannedSite.estimated_duration,
+)
+
+SITE_FIELDS = ('id', 'site_id', 'name', 'tower_owner', 'kabupaten', 'long', 'lat')
+
+
+def plain(value):
+    """JSON and MessagePack friendly form of a column value"""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return to_utc(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def respond(payload, status=200):
+    """Encode `payload` as MessagePack when the client asks for it, JSON otherwise"""
+    offered = [JSON] + (list(MSGPACK_TYPES) if msgpack is not None else [])
+    mimetype = request.accept_mimetypes.best_match(offered, default=JSON)
+
+    if mimetype in MSGPACK_TYPES:
+        body = msgpack.packb(payload)
+    elif orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'))
+
+    response = Response(body, status=status, mimetype=mimetype)
+    response.headers['Cache-Control'] = 'private, no-store'
+    response.vary.add('Accept')
+    return response
+
+
+def requested_fields(available):
+    """Field names from ?fields=a,b,c, or every field; unknown names are a 400"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(available)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def requested_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def projection(available, fields):
+    """Labelled columns for `fields`, plus id and created_at for the keyset cursor"""
+    names = [name for name in fields if available[name] is not None]
+    for key in ('id', 'created_at'):
+        if key not in names:
+            names.append(key)
+    return [available[name].label(name) for name in names]
+
+
+def page(query, model, fields):
+    """Keyset-paginate a projected query and shape the envelope"""
+    try:
+        result = keyset_paginate(query, model, requested_limit(), request.args.get('cursor'))
+    except ValueError as e:
+        abort(400, description=str(e))
+    data = [{name: plain(row._mapping[name]) for name in fields if name in row._mapping} for row in result.items]
+    return result, data
+
+
+def envelope(result, data):
+    return {'data': data, 'next_cursor': result.next_cursor, 'prev_cursor': result.prev_cursor}
+
+
+def filtered(build_query):
+    # The shared list filters raise on malformed dates and enum names
+    try:
+        return build_query()
+    except (KeyError, ValueError) as e:
+        abort(400, description=f"Invalid filter: {str(e)}")
+
+
+def ticket_query(fields, query=None):
+    """Ticket rows with `fields`; the list filters from the request args apply unless `query` is given"""
+    if query is None:
+        query = filtered(filtered_ticket_query)
+    query = query.with_entities(*projection(TICKET_FIELDS, fields))
+    if 'site_code' in fields or 'site_name' in fields:
+        query = query.join(Site, Site.id == Ticket.site_id)
+    return query
+
+
+def visible_ticket_or_404(ticket_id):
+    if not scoped_to_current_user(Ticket.query).filter(Ticket.id == ticket_id).with_entities(Ticket.id).first():
+        abort(404, description='Ticket not found')
+
+
+@bp.errorhandler(HTTPException)
+def api_error(error):
+    return respond({'error': error.description}, error.code)
+
+
+@bp.route('/tickets')
+@login_required
+def list_tickets():
+    fields = requested_fields(TICKET_FIELDS)
+    result, data = page(ticket_query(fields), Ticket, fields)
+    return respond(envelope(result, data))
+
+
+@bp.route('/tickets/<int:ticket_id>')
+@login_required
+def get_ticket(ticket_id):
+    fields = requested_fields(TICKET_FIELDS)
+    # Only visibility applies to a lookup by id, not the list filters
+    row = ticket_query(fields, scoped_to_current_user(Ticket.query)).filter(Ticket.id == ticket_id).first()
+    if row is None:
+        abort(404, description='Ticket not found')
+    return respond({'data': {name: plain(row._mapping[name]) for name in fields}})
+
+
+@bp.route('/tickets/<int:ticket_id>/actions')
+@login_required
+def list_ticket_actions(ticket_id):
+    visible_ticket_or_404(ticket_id)
+    fields = requested_fields(ACTION_FIELDS)
+    query = db.session.query(*projection(ACTION_FIELDS, fields)).filter(TicketAction.ticket_id == ticket_id)
+    if 'user' in fields:
+        query = query.outerjoin(User, User.id == TicketAction.created_by_id)
+    result, data = page(query, TicketAction, fields)
+    return respond(envelope(result, data))
+
+
+def plan_query(fields, query=None):
+    """Plan rows with `fields`; the list filters from the request args apply unless `query` is given"""
+    if query is None:
+        query = filtered(filtered_plan_query)
+    query = query.with_entities(*projection(PLAN_FIELDS, fields))
+    if 'enom_user' in fields:
+        query = query.join(User, User.id == DailyPlan.enom_user_id)
+    return query
+
+
+def attach_planned_sites(data):
+    """Fill in the `sites` of every plan in `data` with one query"""
+    by_plan = {plan['id']: plan for plan in data}
+    for plan in data:
+        plan['sites'] = []
+    if not by_plan:
+        return
+    rows = db.session.query(*PLANNED_SITE_COLUMNS).join(
+        Site, Site.id == PlannedSite.site_id
+    ).filter(
+        PlannedSite.daily_plan_id.in_(list(by_plan))
+    ).order_by(PlannedSite.daily_plan_id, PlannedSite.visit_order).all()
+    for row in rows:
+        site = {key: plain(value) for key, value in row._mapping.items() if key != 'daily_plan_id'}
+        by_plan[row.daily_plan_id]['sites'].append(site)
+
+
+def require_plan_access():
+    if current_user.role not in ('enom', 'tsel'):
+        abort(403, description='Unauthorized access')
+
+
+@bp.route('/plans')
+@login_required
+def list_plans():
+    require_plan_access()
+    fields = requested_fields(PLAN_FIELDS)
+    result, data = page(plan_query(fields), DailyPlan, fields + ['id'])
+    if 'sites' in fields:
+        attach_planned_sites(data)
+    if 'id' not in fields:
+        for plan in data:
+            del plan['id']
+    return respond(envelope(result, data))
+
+
+@bp.route('/plans/<int:plan_id>')
+@login_required
+def get_plan(plan_id):
+    require_plan_access()
+    fields = requested_fields(PLAN_FIELDS)
+    row = plan_query(fields, plans_scoped_to_current_user(DailyPlan.query)).filter(DailyPlan.id == plan_id).first()
+    if row is None:
+        abort(404, description='Plan not found')
+    plan = {name: plain(row._mapping[name]) for name in fields + ['id'] if name in row._mapping}
+    if 'sites' in fields:
+        attach_planned_sites([plan])
+    if 'id' not in fields:
+        del plan['id']
+    return respond({'data': plan})
+
+
+def site_dict(record, fields):
+    return {name: getattr(record, name) for name in fields}
+
+
+@bp.route('/sites')
+@login_required
+def list_sites():
+    """Sites from the shared catalog in id order; the cursor is the last id returned"""
+    fields = requested_fields(SITE_FIELDS)
+    limit = requested_limit()
+    cursor = request.args.get('cursor')
+    try:
+        after = int(cursor) if cursor else 0
+    except ValueError:
+        abort(400, description='Invalid cursor')
+
+    kabupaten = request.args.get('kabupaten', '').lower()
+    tower_owner = request.args.get('tower_owner', '').lower()
+    records = heapq.nsmallest(
+        limit + 1,
+        (record for record in site_catalog.snapshot()
+         if record.id > after
+         and (not kabupaten or record.kabupaten.lower() == kabupaten)
+         and (not tower_owner or record.tower_owner.lower() == tower_owner)),
+        key=lambda record: record.id
+    )
+
+    next_cursor = str(records[limit - 1].id) if len(records) > limit else None
+    return respond({
+        'data': [site_dict(record, fields) for record in records[:limit]],
+        'next_cursor': next_cursor,
+        'prev_cursor': None
+    })
+
+
+@bp.route('/sites/<int:site_id>')
+@login_required
+def get_site(site_id):
+    record = site_catalog.snapshot().get(site_id)
+    if record is None:
+        abort(404, description='Site not found')
+    return respond({'data': site_dict(record, requested_fields(SITE_FIELDS))})
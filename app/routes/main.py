@@ -1,15 +1,35 @@
-from flask import Blueprint, render_template, request, current_app, redirect, url_for, flash, Flask, Response
+from flask import Blueprint, render_template, request, current_app, redirect, url_for, flash, Flask, Response, stream_with_context
 from app.models import Site, Ticket, TicketAction, ProblemCategory, TicketStatus, EnomAssignee, User, DailyPlan, PlannedSite, PlanComment, PlanStatus
-from app import db, logger
+from app import db, logger, limiter, get_user_or_ip
+from app.services import rollup
+from app.services.cache import dashboard_cache, TICKETS, PLANS
+from app.services.autocomplete import site_autocomplete
+from app.services.sites import site_catalog
+from app.services.photos import photo_pipeline
+from app.services.ticket_numbers import ticket_numbers
+from app.services import bulk, export, metrics, photo_store, plan_import, search, tickets, trends, uploads
+from app.services.pagination import keyset_paginate, approximate_count
+from app.services.events import (
+    event_broker, ticket_data, visible_to, TICKET_CREATED, TICKET_STATUS_CHANGED, TICKET_DELETED,
+    TICKETS_BULK_CHANGED, ACTION_ADDED, PLAN_SUBMITTED, PLAN_APPROVED, PLAN_REJECTED
+)
+from app.services.dashboard import (
+    build_dashboard_stats, build_technician_stats, daily_trend, todays_plan_summary,
+    todays_plans, top_sites, site_markers_geojson, top_planned_sites, planned_markers
+)
+from dataclasses import asdict
 from datetime import datetime, timedelta
 import pytz
 from werkzeug.utils import secure_filename
 import os
-from sqlalchemy import or_, func
+from sqlalchemy import func, or_
 from dotenv import load_dotenv
 from flask_login import login_required, current_user
 from flask import jsonify, abort
 import re
+import json
+import hashlib
+import time
 
 bp = Blueprint('main', __name__, template_folder='../../templates')
 
@@ -18,288 +38,93 @@ load_dotenv()  # Add this near the top of the file
 # Get Jakarta timezone
 jakarta_tz = pytz.timezone('Asia/Jakarta')
 
+# Longest range /api/stats/trend will accept
+MAX_TREND_DAYS = 3 * 366
+
 @bp.route('/')
 def index():
     # Check if user is authenticated first
     if not current_user.is_authenticated:
         return redirect(url_for('auth.login'))
-        
-    # Then proceed with all your existing code
-    # Get current date and 30 days ago date in Jakarta time
-    current_datetime = datetime.now(jakarta_tz)
-    current_date = current_datetime.date()
-
-    if current_user.role == 'enom':
-        username_prefix = current_user.username.split('_')[0].upper()
-
-        status_counts = {status: 0 for status in TicketStatus}
 
-        results = Ticket.query.filter(
-            Ticket.assigned_to_enom == username_prefix # change here
-        ).all()
+    # Widgets are fetched by the page from /api/dashboard/<widget>
+    return render_template('index.html',
+                       statuses=TicketStatus,
+                       mapbox_token=os.getenv('MAPBOX_TOKEN'))
 
-        for ticket in results:
-            status_counts[ticket.status] += 1
+# Widgets served from slices of the shared dashboard stats payload
+STATS_WIDGET_FIELDS = {
+    'counters': ('status_counts', 'total_30_days'),
+    'distribution': ('status_30_days', 'category_distribution', 'assignee_distribution', 'avg_resolution_time'),
+}
 
-        open_tickets = status_counts[TicketStatus.OPEN]
-        in_progress_tickets = status_counts[TicketStatus.IN_PROGRESS]
-        pending_tickets = status_counts[TicketStatus.PENDING]
-        resolved_tickets = status_counts[TicketStatus.RESOLVED]
+def dashboard_widget_source(widget, today):
+    """Return (section, scope, cache key, compute) for a widget, or None"""
+    day = today.isoformat()
 
+    if current_user.role == 'enom':
+        prefix = current_user.username.split('_')[0].upper()
+        if widget == 'counters':
+            # Aging moves with the clock, so technician stats are recomputed at least hourly
+            hour = datetime.now(jakarta_tz).strftime('%H')
+            return ('technician_stats', TICKETS, f"enom:{prefix}:{day}:{hour}",
+                    lambda: asdict(build_technician_stats(today, prefix)))
+        if widget == 'todays_plans':
+            def own_plan():
+                plan = todays_plan_summary(current_user.id, today)
+                if plan:
+                    plan['url'] = url_for('main.view_plan', plan_id=plan['id'])
+                return {'plan': plan}
+            return 'todays_plan', PLANS, f"enom:{current_user.id}:{day}", own_plan
     else:
-        status_counts = {
-            TicketStatus.OPEN: Ticket.query.filter_by(status=TicketStatus.OPEN).count(),
-            TicketStatus.IN_PROGRESS: Ticket.query.filter_by(status=TicketStatus.IN_PROGRESS).count(),
-            TicketStatus.PENDING: Ticket.query.filter_by(status=TicketStatus.PENDING).count(),
-            TicketStatus.RESOLVED: Ticket.query.filter_by(status=TicketStatus.RESOLVED).count(),
-        }
-        open_tickets = status_counts[TicketStatus.OPEN]
-        in_progress_tickets = status_counts[TicketStatus.IN_PROGRESS]
-        pending_tickets = status_counts[TicketStatus.PENDING]
-        resolved_tickets = status_counts[TicketStatus.RESOLVED]
-
-    # Total tickets in last 30 days (using timezone aware query)
-    total_30_days = Ticket.query.filter(
-        Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= 
-        datetime.combine(current_date - timedelta(days=30), datetime.min.time()).astimezone(jakarta_tz)
-    ).count()
-
-    # Status distribution for last 30 days
-    thirty_days_ago = datetime.combine(current_date - timedelta(days=30), datetime.min.time()).astimezone(jakarta_tz)
-    status_30_days = {
-        'OPEN': Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-            Ticket.status == TicketStatus.OPEN
-        ).count(),
-        'IN_PROGRESS': Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-            Ticket.status == TicketStatus.IN_PROGRESS
-        ).count(),
-        'PENDING': Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-            Ticket.status == TicketStatus.PENDING
-        ).count(),
-        'RESOLVED': Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-            Ticket.status == TicketStatus.RESOLVED
-        ).count()
-    }
-
-    # Problem category distribution for last 30 days
-    category_distribution = {}
-    for category in ProblemCategory:
-        count = Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-            Ticket.problem_category == category
-        ).count()
-        category_distribution[category.name] = count
-
-    # Average resolution time in the last 30 days
-    resolved_tickets_30_days = Ticket.query.filter(
-        Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-        Ticket.closed_at.isnot(None)
-    ).all()
-    
-    resolution_times = []
-    for ticket in resolved_tickets_30_days:
-        # Convert timestamps to Jakarta time
-        created_at_jkt = ticket.created_at.astimezone(jakarta_tz)
-        closed_at_jkt = ticket.closed_at.astimezone(jakarta_tz)
-        resolution_time = closed_at_jkt - created_at_jkt
-        resolution_times.append(resolution_time.total_seconds() / 3600)  # Convert to hours
-    
-    avg_resolution_time = sum(resolution_times) / len(resolution_times) if resolution_times else 0
-
-    # Get assignee distribution for last 30 days
-    assignee_distribution = {}
-    for assignee in EnomAssignee:
-        count = Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago,
-            Ticket.assigned_to_enom == assignee
-        ).count()
-        assignee_distribution[assignee.name] = count
-
-    # Get top 5 sites with most tickets in last 30 days
-    top_sites = db.session.query(
-        Site.site_id,
-        Site.name,
-        func.count(Ticket.id).label('ticket_count')
-    ).join(
-        Ticket,
-        Site.id == Ticket.site_id
-    ).filter(
-        Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= thirty_days_ago
-    ).group_by(
-        Site.id
-    ).order_by(
-        func.count(Ticket.id).desc()
-    ).limit(5).all()
-
-    top_sites_data = {
-        'site_ids': [site.site_id for site in top_sites],
-        'site_names': [site.name for site in top_sites],
-        'ticket_counts': [site.ticket_count for site in top_sites]
-    }
-
-    # Get trend data for the last 7 days
-    trend_data = []
-    trend_labels = []
-    
-    for i in range(6, -1, -1):
-        date = current_date - timedelta(days=i)
-        
-        # Create start and end timestamps for Jakarta date
-        start_of_day = datetime.combine(date, datetime.min.time()).astimezone(jakarta_tz)
-        end_of_day = datetime.combine(date, datetime.max.time()).astimezone(jakarta_tz)
-        
-        # Query using AT TIME ZONE to convert timestamps to Jakarta time before comparison
-        tickets = Ticket.query.filter(
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') >= start_of_day,
-            Ticket.created_at.op('AT TIME ZONE')('UTC').op('AT TIME ZONE')('Asia/Jakarta') < end_of_day + timedelta(seconds=1)
-        ).all()
-        
-        count = len(tickets)
-        trend_data.append(count)
-        trend_labels.append(date.strftime('%d-%m-%Y'))
-
-    # Get sites with tickets for map
-    sites_with_tickets = db.session.query(
-        Site,
-        func.count(Ticket.id).label('ticket_count')
-    ).join(
-        Ticket, Site.id == Ticket.site_id
-    ).filter(
-        Ticket.status.in_([TicketStatus.OPEN, TicketStatus.IN_PROGRESS, TicketStatus.PENDING])
-    ).group_by(Site.id).all()
-
-    # Format site data for the map
-    site_markers = [{
-        'id': site.Site.id,
-        'site_id': site.Site.site_id,
-        'name': site.Site.name,
-        'kabupaten': site.Site.kabupaten,
-        'lat': float(site.Site.lat),
-        'long': float(site.Site.long),
-        'ticket_count': site.ticket_count,
-        'status_counts': {
-            'OPEN': Ticket.query.filter(
-                Ticket.site_id == site.Site.id,
-                Ticket.status == TicketStatus.OPEN
-            ).count(),
-            'IN_PROGRESS': Ticket.query.filter(
-                Ticket.site_id == site.Site.id,
-                Ticket.status == TicketStatus.IN_PROGRESS
-            ).count(),
-            'PENDING': Ticket.query.filter(
-                Ticket.site_id == site.Site.id,
-                Ticket.status == TicketStatus.PENDING
-            ).count()
-        },
-        'status': max(
-            ['OPEN', 'IN_PROGRESS', 'PENDING'],
-            key=lambda s: Ticket.query.filter(
-                Ticket.site_id == site.Site.id,
-                Ticket.status == getattr(TicketStatus, s)
-            ).count()
-        ) if site.ticket_count > 0 else 'NONE'
-    } for site in sites_with_tickets if site.Site.lat and site.Site.long]
-
-    # Add today's date for ENOM plan check
+        if widget == 'counters':
+            return 'stats', TICKETS, day, lambda: asdict(build_dashboard_stats(today))
+        if current_user.role == 'tsel':
+            if widget == 'distribution':
+                return 'stats', TICKETS, day, lambda: asdict(build_dashboard_stats(today))
+            if widget == 'trend':
+                return 'trend', TICKETS, day, lambda: daily_trend(today)
+            if widget == 'top_sites':
+                return 'top_sites', TICKETS, day, lambda: top_sites(today)
+            if widget == 'top_planned_sites':
+                return 'top_planned_sites', PLANS, day, lambda: top_planned_sites(today)
+            if widget == 'todays_plans':
+                def plans_overview():
+                    plans = todays_plans(today)
+                    return {
+                        'count': len(plans),
+                        'pending': sum(1 for plan in plans if plan.status == PlanStatus.SUBMITTED),
+                        'html': render_template('dashboard/todays_plans.html', todays_plans=plans)
+                    }
+                return 'todays_plans', PLANS, day, plans_overview
+
+    if widget == 'planned_markers':
+        return 'planned_site_markers', PLANS, day, lambda: planned_markers(today)
+    return None
+
+@bp.route('/api/dashboard/<widget>')
+@login_required
+# Every page load fetches each widget, and live events refetch some of them
+@limiter.limit("1200 per hour", key_func=get_user_or_ip)
+def dashboard_widget(widget):
+    started = time.perf_counter()
     today = datetime.now(jakarta_tz).date()
 
-    # Get top 10 planned sites in the last two weeks
-    two_weeks_ago = today - timedelta(days=14)
-    top_planned_sites = db.session.query(
-        Site.site_id,
-        Site.name,
-        func.count(PlannedSite.id).label('visit_count')
-    ).join(
-        PlannedSite,
-        Site.id == PlannedSite.site_id
-    ).join(
-        DailyPlan,
-        PlannedSite.daily_plan_id == DailyPlan.id
-    ).filter(
-        DailyPlan.plan_date >= two_weeks_ago,
-        DailyPlan.plan_date <= today
-    ).group_by(
-        Site.id
-    ).order_by(
-        func.count(PlannedSite.id).desc()
-    ).limit(10).all()
-
-    top_planned_sites_data = {
-        'site_ids': [site.site_id for site in top_planned_sites],
-        'site_names': [site.name for site in top_planned_sites],
-        'visit_counts': [site.visit_count for site in top_planned_sites]
-    }
-
-    # Get today's planned sites for the map
-    todays_planned_sites = db.session.query(
-        Site,
-        DailyPlan.enom_user_id,
-        User.username.label('enom_username'),
-        PlannedSite.planned_actions,
-        PlannedSite.estimated_duration
-    ).join(
-        PlannedSite,
-        Site.id == PlannedSite.site_id
-    ).join(
-        DailyPlan,
-        PlannedSite.daily_plan_id == DailyPlan.id
-    ).join(
-        User,
-        DailyPlan.enom_user_id == User.id
-    ).filter(
-        DailyPlan.plan_date == today
-    ).all()
-
-    planned_site_markers = [{
-        'id': site.Site.id,
-        'site_id': site.Site.site_id,
-        'name': site.Site.name,
-        'kabupaten': site.Site.kabupaten,
-        'lat': float(site.Site.lat),
-        'long': float(site.Site.long),
-        'enom_username': site.enom_username,
-        'planned_actions': site.planned_actions,
-        'estimated_duration': site.estimated_duration
-    } for site in todays_planned_sites if site.Site.lat and site.Site.long]
-
-    # Add today's plans for TSEL users
-    todays_plans = None
-    if current_user.is_authenticated and current_user.role == 'tsel':
-        todays_plans = DailyPlan.query.filter(
-            DailyPlan.plan_date == today
-        ).options(
-            db.joinedload(DailyPlan.enom_user),
-            db.joinedload(DailyPlan.planned_sites).joinedload(PlannedSite.site)
-        ).all()
+    source = dashboard_widget_source(widget, today)
+    if source is None:
+        abort(404)
+    section, scope, key, compute = source
 
-    return render_template('index.html',
-                       open_tickets=open_tickets,
-                       in_progress_tickets=in_progress_tickets,
-                       pending_tickets=pending_tickets,
-                       resolved_tickets=resolved_tickets,
-                       total_30_days=total_30_days,
-                       status_30_days=status_30_days,
-                       assignee_distribution=assignee_distribution,
-                       top_sites_data=top_sites_data,
-                       category_distribution=category_distribution,
-                       avg_resolution_time=round(avg_resolution_time, 1),
-                       trend_data=trend_data,
-                       trend_labels=trend_labels,
-                       statuses=TicketStatus,
-                       site_markers=site_markers,
-                       planned_site_markers=planned_site_markers,
-                       top_planned_sites_data=top_planned_sites_data,
-                       mapbox_token=os.getenv('MAPBOX_TOKEN'),
-                       today=today,
-                       todays_plans=todays_plans)
+    payload = dashboard_cache.get_or_compute(section, scope, f"{current_user.role}:{key}", compute)
+    if section == 'stats':
+        payload = {field: payload[field] for field in STATS_WIDGET_FIELDS[widget]}
 
-@bp.route('/tickets', methods=['GET'])
-@login_required
-def list_tickets():
+    response = jsonify(payload)
+    response.headers['Server-Timing'] = f'widget;desc="{widget}";dur={(time.perf_counter() - started) * 1000:.1f}'
+    return response
+
+def filtered_ticket_query():
+    """Ticket query with the list filters from the request args, scoped to ENOM users' own tickets"""
     # Get filter parameters
     status_filter = request.args.get('status')
     search_query = request.args.get('search', '').strip()
@@ -314,10 +139,6 @@ def list_tickets():
     status_enum = TicketStatus[status_filter] if status_filter in TicketStatus.__members__ else None
     category_enum = ProblemCategory[category_filter] if category_filter in ProblemCategory.__members__ else None
 
-    # Get page number, limit items per page
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 30, type=int), 100)  # Prevent abuse
-
     # Start with base query
     query = Ticket.query
 
@@ -329,13 +150,12 @@ def list_tickets():
     if site_filter:
         query = query.filter(Ticket.site_id == site_filter)
     if search_query:
-        query = query.filter(or_(
-            Ticket.ticket_number.ilike(f"%{search_query}%"),
-            Ticket.created_by.ilike(f"%{search_query}%"),
-            Ticket.description.ilike(f"%{search_query}%")
-        ))
+        query = query.filter(search.ticket_filter(search_query))
 
-    # Filter by ENOM user
+    return scoped_to_current_user(query)
+
+def scoped_to_current_user(query):
+    # ENOM users only see tickets assigned to their own company
     if current_user.role == 'enom':
         try:
             enom_enum = current_user.username.split('_')[0].upper()
@@ -344,20 +164,86 @@ def list_tickets():
         except KeyError as e:
             logger.warning(f"Invalid ENOM user: {str(e)}")
 
-    # Order and paginate the query
-    pagination = query.order_by(Ticket.created_at.desc()).paginate(
-        page=page, 
-        per_page=per_page,
-        error_out=False
-    )
+    return query
+
+def locked_ticket_or_404(ticket_id):
+    """The ticket, locked FOR UPDATE until commit so its rollup snapshot is the state being changed"""
+    return Ticket.query.filter_by(id=ticket_id).with_for_update().populate_existing().first_or_404()
+
+def visible_ticket_or_404(ticket_id):
+    if not scoped_to_current_user(Ticket.query.filter(Ticket.id == ticket_id)).with_entities(Ticket.id).first():
+        abort(404)
+
+@bp.route('/tickets', methods=['GET'])
+@login_required
+def list_tickets():
+    # Opaque cursor from the previous page, limit items per page
+    cursor = request.args.get('cursor')
+    per_page = min(request.args.get('per_page', 30, type=int), 100)  # Prevent abuse
+
+    query = filtered_ticket_query()
+
+    # Paginate on (created_at, id) so deep pages cost the same as the first
+    try:
+        pagination = keyset_paginate(tickets.list_query(query), Ticket, per_page, cursor)
+    except ValueError:
+        abort(400)
+    pagination.items = tickets.ticket_rows(pagination.items)
+    pagination.total, pagination.total_is_estimate = approximate_count(query)
 
-    sites = Site.query.all()
     return render_template('tickets.html', 
                            pagination=pagination,
                            tickets=pagination.items, 
-                           sites=sites,
+                           sites=site_catalog.snapshot(),
+                           selected_site=request.args.get('site', type=int),
                            categories=ProblemCategory,
-                           statuses=TicketStatus)
+                           statuses=TicketStatus,
+                           enom_assignees=EnomAssignee,
+                           export_formats=export.available_formats())
+
+def export_response(kind, header, rows):
+    """Stream an export in the format from the request args as a download"""
+    fmt = request.args.get('format', 'csv')
+    if fmt == 'xlsx':
+        chunks = export.xlsx_chunks(header, rows, kind.title())
+    else:
+        chunks = export.csv_chunks(header, rows)
+    filename = f"{kind}-{datetime.now(jakarta_tz).strftime('%Y%m%d')}.{fmt}"
+    return Response(stream_with_context(chunks),
+                    mimetype=export.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@bp.route('/tickets/export', methods=['GET'])
+@login_required
+def export_tickets():
+    if request.args.get('format', 'csv') not in export.available_formats():
+        abort(400)
+    header, rows = export.ticket_rows(filtered_ticket_query())
+    return export_response('tickets', header, rows)
+
+@bp.route('/search', methods=['GET'])
+@login_required
+def search_all():
+    search_query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 20
+
+    results = []
+    if search_query:
+        enom_user_id = enom_assignee = None
+        if current_user.role == 'enom':
+            enom_user_id = current_user.id
+            prefix = current_user.username.split('_')[0].upper()
+            enom_assignee = EnomAssignee[prefix] if prefix in EnomAssignee.__members__ else None
+        # One extra row tells whether there is a next page
+        results = search.search(search_query, enom_assignee, enom_user_id,
+                                limit=per_page + 1, offset=(page - 1) * per_page)
+
+    return render_template('search.html',
+                           query=search_query,
+                           results=results[:per_page],
+                           page=page,
+                           has_next=len(results) > per_page)
 
 @bp.route('/tickets/new', methods=['GET', 'POST'])
 @login_required
@@ -374,7 +260,7 @@ def create_ticket():
             current_time = datetime.now(jakarta_tz)
             
             new_ticket = Ticket(
-                ticket_number=f"TKT-{current_time.strftime('%Y%m%d%H%M%S')}",
+                ticket_number=ticket_numbers.allocate(current_time),
                 site_id=request.form['site_id'],
                 problem_category=request.form['problem_category'],
                 description=request.form['description'],
@@ -385,7 +271,10 @@ def create_ticket():
                 status=TicketStatus.OPEN
             )
             db.session.add(new_ticket)
+            rollup.record(after=[rollup.snapshot(new_ticket)])
             db.session.commit()
+            dashboard_cache.invalidate(TICKETS)
+            event_broker.publish(TICKET_CREATED, **ticket_data(new_ticket))
             
             # Add initial ticket action for creation
             action = TicketAction(
@@ -401,42 +290,52 @@ def create_ticket():
             flash('Ticket created successfully', 'success')
             return redirect(url_for('main.list_tickets'))
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error creating ticket: {str(e)}")
             flash("Ticket creation failed", "danger")
             return render_template('create_ticket.html', 
-                                sites=Site.query.all(), 
+                                sites=site_catalog.snapshot(), 
                                 categories=ProblemCategory,
                                 enom_assignees=EnomAssignee,
                                 message="Ticket creation failed", 
                                 message_category="danger")
 
-    sites = Site.query.all()
     return render_template('create_ticket.html', 
-                         sites=sites, 
+                         sites=site_catalog.snapshot(), 
                          categories=ProblemCategory,
                          enom_assignees=EnomAssignee)
 
 @bp.route('/tickets/<int:ticket_id>/actions', methods=['POST'])
+@login_required
 def add_action(ticket_id):
     if not all(is_safe_string(v) for v in request.form.values()):
         abort(400)
 
+    photo_sha256 = None
     try:
         ticket = Ticket.query.get_or_404(ticket_id)
         current_time = datetime.now(jakarta_tz)
 
         photo = request.files.get('photo')
-        photo_path = None
-        if photo:
-            filename = secure_filename(photo.filename)
-            photo_path = f'uploads/{filename}'
-            full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            photo.save(full_path)
+        upload_id = request.form.get('upload_id')
+        photo_path = thumb_path = display_path = None
+        # The photo's hash stays locked until the action is committed
+        if upload_id:
+            # Sent earlier in chunks to /photo-uploads
+            photo_path, photo_sha256 = uploads.finalize(upload_id, current_user.id)
+        elif photo:
+            photo_path, photo_sha256 = photo_store.store(photo)
+        if photo_path:
+            # A photo that is already stored comes with its variants
+            thumb_path, display_path = photo_store.known_variants(photo_path)
 
         action = TicketAction(
             ticket_id=ticket_id,
             action_text=request.form['action_text'],
             photo_path=photo_path,
+            photo_sha256=photo_sha256,
+            thumb_path=thumb_path,
+            display_path=display_path,
             created_by=request.form['created_by'],
             created_by_id=current_user.id,
             created_at=current_time
@@ -444,20 +343,144 @@ def add_action(ticket_id):
 
         db.session.add(action)
         db.session.commit()
+        if photo_path and thumb_path is None:
+            photo_pipeline.submit(photo_path)
+        event_broker.publish(ACTION_ADDED, ticket_id=ticket_id, action_id=action.id,
+                             assigned_to_enom=ticket.assigned_to_enom.name if ticket.assigned_to_enom else None)
 
-        return render_template('view_ticket.html', 
-                            ticket=ticket,
-                            actions=TicketAction.query.filter_by(ticket_id=ticket_id).order_by(TicketAction.created_at.desc()).all(),
-                            message="Action added successfully",
-                            message_category="success")
+        return timeline_entry(ticket_id, action.id, "Action added successfully")
     except Exception as e:
+        db.session.rollback()
+        # Drops the stored photo unless another action already shares it
+        photo_store.release({photo_sha256} if photo_sha256 else set())
         return jsonify({'error': str(e)}), 400
 
+# Resumable photo uploads: POST to start, PATCH chunks at Upload-Offset, HEAD to
+# resume after a dropped connection, then send upload_id with the action form
+# One budget per user for all upload requests: a 32 MB photo is 32 one-megabyte chunks
+photo_upload_limit = limiter.shared_limit("600 per hour", scope='photo_uploads', key_func=get_user_or_ip)
+
+def upload_offset_response(offset, size=None, status=204):
+    response = current_app.response_class(status=status)
+    response.headers['Upload-Offset'] = str(offset)
+    if size is not None:
+        response.headers['Upload-Length'] = str(size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def upload_error(error):
+    response = jsonify({'error': str(error), 'offset': error.offset})
+    response.status_code = error.status
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response
+
+@bp.route('/photo-uploads', methods=['POST'])
+@login_required
+@photo_upload_limit
+def start_photo_upload():
+    payload = request.get_json(silent=True) or {}
+    try:
+        upload_id = uploads.initiate(current_user.id, payload.get('filename'), payload.get('size'))
+    except uploads.UploadError as e:
+        return upload_error(e)
+    response = jsonify({
+        'upload_id': upload_id,
+        'offset': 0,
+        'chunk_size': current_app.config['PHOTO_UPLOAD_CHUNK_SIZE']
+    })
+    response.status_code = 201
+    response.headers['Location'] = url_for('main.photo_upload_status', upload_id=upload_id)
+    return response
+
+@bp.route('/photo-uploads/<upload_id>', methods=['HEAD'])
+@login_required
+@photo_upload_limit
+def photo_upload_status(upload_id):
+    try:
+        offset, size = uploads.status(upload_id, current_user.id)
+    except uploads.UploadError as e:
+        return upload_error(e)
+    return upload_offset_response(offset, size, status=200)
+
+@bp.route('/photo-uploads/<upload_id>', methods=['PATCH'])
+@login_required
+@photo_upload_limit
+def append_photo_upload(upload_id):
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    try:
+        # Read from the request stream as it arrives, never buffered whole
+        offset = uploads.append(upload_id, current_user.id, offset, request.stream)
+    except uploads.UploadError as e:
+        return upload_error(e)
+    return upload_offset_response(offset)
+
+@bp.route('/photo-uploads/<upload_id>', methods=['DELETE'])
+@login_required
+@photo_upload_limit
+def discard_photo_upload(upload_id):
+    try:
+        uploads.discard(upload_id, current_user.id)
+    except uploads.UploadError as e:
+        return upload_error(e)
+    return '', 204
+
+def wants_partial():
+    # Set by the ticket page's fetch() calls; plain form posts get the full page flow
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+def timeline_entry(ticket_id, action_id, message):
+    """Answer a ticket write with just the new timeline entry, or redirect a plain form post"""
+    if wants_partial():
+        return render_template('tickets/action.html', action=tickets.ticket_action(action_id)), 201
+    flash(message, 'success')
+    return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
+
+@bp.route('/uploads/<path:name>', methods=['GET'])
+@login_required
+# A timeline page shows up to 20 thumbnails, and technicians' phones share carrier NAT addresses
+@limiter.limit("3000 per hour", key_func=get_user_or_ip)
+def ticket_photo(name):
+    """A ticket photo or one of its variants, for users who can see a ticket it is attached to"""
+    sha256 = photo_store.content_hash(name)
+    if sha256:
+        attached = TicketAction.photo_sha256 == sha256
+    else:
+        # Photos not yet moved into the content-addressed store
+        photo_path = f"{photo_store.URL_PREFIX}/{name}"
+        attached = or_(TicketAction.photo_path == photo_path,
+                       TicketAction.thumb_path == photo_path,
+                       TicketAction.display_path == photo_path)
+    visible = scoped_to_current_user(
+        Ticket.query.join(TicketAction, TicketAction.ticket_id == Ticket.id).filter(attached)
+    ).with_entities(Ticket.id).first()
+    if visible is None:
+        abort(404)
+    return photo_store.send(name, immutable=sha256 is not None)
+
 @bp.route('/tickets/<int:ticket_id>', methods=['GET'])
+@login_required
 def view_ticket(ticket_id):
-    ticket = Ticket.query.get_or_404(ticket_id)
-    actions = TicketAction.query.filter_by(ticket_id=ticket_id).order_by(TicketAction.created_at.desc()).all()
-    return render_template('view_ticket.html', ticket=ticket, actions=actions)
+    """Ticket detail page from row projections, with the newest page of its timeline"""
+    visible_ticket_or_404(ticket_id)
+    ticket = tickets.ticket_detail(ticket_id)
+    if ticket is None:
+        abort(404)
+    return render_template('view_ticket.html', ticket=ticket, timeline=tickets.ticket_actions(ticket_id))
+
+@bp.route('/tickets/<int:ticket_id>/timeline', methods=['GET'])
+@login_required
+def ticket_timeline(ticket_id):
+    """Older timeline entries, one page after `cursor`"""
+    visible_ticket_or_404(ticket_id)
+    try:
+        timeline = tickets.ticket_actions(ticket_id, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return render_template('tickets/timeline.html', ticket_id=ticket_id, timeline=timeline)
 
 @bp.route('/tickets/<int:ticket_id>/update_status', methods=['POST'])
 @login_required
@@ -466,7 +489,7 @@ def update_ticket_status(ticket_id):
         abort(400)
 
     try:
-        ticket = Ticket.query.get_or_404(ticket_id)
+        ticket = locked_ticket_or_404(ticket_id)
         new_status = request.form.get('status')
         current_time = datetime.now(jakarta_tz)
         
@@ -479,29 +502,32 @@ def update_ticket_status(ticket_id):
             created_at=current_time
         )
         
-        ticket.status = TicketStatus[new_status]
-        
-        if new_status == 'RESOLVED':
-            ticket.resolved_at = current_time
-        elif new_status == 'CLOSED':
-            ticket.closed_at = current_time
-        elif ticket.resolved_at is not None:
-            ticket.resolved_at = None
+        previous_status = ticket.status.name
+        with rollup.track(ticket):
+            ticket.status = TicketStatus[new_status]
+
+            if new_status == 'RESOLVED':
+                ticket.resolved_at = current_time
+            elif new_status == 'CLOSED':
+                ticket.closed_at = current_time
+            elif ticket.resolved_at is not None:
+                ticket.resolved_at = None
         
         db.session.add(action)
         db.session.commit()
+        dashboard_cache.invalidate(TICKETS)
+        event_broker.publish(TICKET_STATUS_CHANGED, previous_status=previous_status, **ticket_data(ticket))
+        event_broker.publish(ACTION_ADDED, ticket_id=ticket_id, action_id=action.id,
+                             assigned_to_enom=ticket.assigned_to_enom.name if ticket.assigned_to_enom else None)
         
-        return render_template('view_ticket.html', 
-                             ticket=ticket, 
-                             actions=TicketAction.query.filter_by(ticket_id=ticket_id).order_by(TicketAction.created_at.desc()).all(),
-                             message="Status updated successfully",
-                             message_category="success")
+        return timeline_entry(ticket_id, action.id, "Status updated successfully")
     except Exception as e:
-        return render_template('view_ticket.html', 
-                             ticket=ticket, 
-                             actions=TicketAction.query.filter_by(ticket_id=ticket_id).order_by(TicketAction.created_at.desc()).all(),
-                             message="Failed to update status",
-                             message_category="danger")
+        db.session.rollback()
+        logger.error(f"Error updating status of ticket {ticket_id}: {str(e)}")
+        if wants_partial():
+            return jsonify({'error': 'Failed to update status'}), 400
+        flash('Failed to update status', 'danger')
+        return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
 
 @bp.route('/ticket/<int:ticket_id>/edit-description', methods=['POST'])
 def edit_ticket_description(ticket_id):
@@ -529,40 +555,16 @@ def test():
 @login_required
 def search_sites():
     term = request.args.get('term', '')
-    logger.debug(f"Search term received: {term}")
-    
+    page = max(request.args.get('page', 1, type=int), 1)
+
     try:
-        # Search sites by ID or name
-        query = Site.query.filter(
-            or_(
-                Site.site_id.ilike(f'%{term}%'),
-                Site.name.ilike(f'%{term}%'),
-                Site.kabupaten.ilike(f'%{term}%')
-            )
-        )
-        
-        # Debug: Print the SQL query
-        logger.debug(f"SQL Query: {query}")
-        
-        sites = query.limit(10).all()
-        logger.debug(f"Found {len(sites)} sites")
-        
-        results = [{
-            'id': site.id,
-            'text': f'{site.site_id} - {site.name}',
-            'site_id': site.site_id,
-            'name': site.name,
-            'kabupaten': site.kabupaten
-        } for site in sites]
-        
-        response = {
+        results, more = site_autocomplete.search(term, page)
+        return jsonify({
             'results': results,
             'pagination': {
-                'more': False
+                'more': more
             }
-        }
-        logger.debug(f"Returning response: {response}")
-        return jsonify(response)
+        })
         
     except Exception as e:
         logger.error(f"Error in site search: {str(e)}")
@@ -578,15 +580,19 @@ def resolve_ticket(ticket_id):
     if not all(is_safe_string(v) for v in request.form.values()):
         abort(400)
 
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = locked_ticket_or_404(ticket_id)
     
     if current_user.role != 'enom' or ticket.assigned_to_id != current_user.id:
         flash('Only assigned ENOM users can resolve tickets')
         return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
     
-    ticket.status = 'resolved'
-    ticket.resolved_at = datetime.utcnow()
+    previous_status = ticket.status.name
+    with rollup.track(ticket):
+        ticket.status = TicketStatus.RESOLVED
+        ticket.resolved_at = datetime.utcnow()
     db.session.commit()
+    dashboard_cache.invalidate(TICKETS)
+    event_broker.publish(TICKET_STATUS_CHANGED, previous_status=previous_status, **ticket_data(ticket))
     return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
 
 @bp.route('/ticket/<int:ticket_id>/close', methods=['POST'])
@@ -595,41 +601,38 @@ def close_ticket(ticket_id):
     if not all(is_safe_string(v) for v in request.form.values()):
         abort(400)
 
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = locked_ticket_or_404(ticket_id)
     
     if current_user.role != 'tsel':
         flash('Only Tsel users can close tickets')
         return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
     
-    if ticket.status != 'resolved':
+    if ticket.status != TicketStatus.RESOLVED:
         flash('Ticket must be resolved before closing')
         return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
     
-    ticket.status = 'closed'
-    ticket.closed_at = datetime.utcnow()
+    with rollup.track(ticket):
+        ticket.status = TicketStatus.CLOSED
+        ticket.closed_at = datetime.utcnow()
     db.session.commit()
+    dashboard_cache.invalidate(TICKETS)
+    event_broker.publish(TICKET_STATUS_CHANGED, previous_status=TicketStatus.RESOLVED.name, **ticket_data(ticket))
     return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
 
-@bp.route('/plans', methods=['GET'])
-@login_required
-def list_plans():
+def plans_scoped_to_current_user(query):
+    # ENOM users only see their own plans
+    if current_user.role == 'enom':
+        query = query.filter_by(enom_user_id=current_user.id)
+    return query
+
+def filtered_plan_query():
+    """DailyPlan query with the list filters from the request args, scoped to ENOM users' own plans"""
     # Get filter parameters
     date_filter = request.args.get('date')
     status_filter = request.args.get('status')
     enom_user_filter = request.args.get('enom_user')
-    
-    # Base query with eager loading
-    query = DailyPlan.query.options(
-        db.joinedload(DailyPlan.enom_user),
-        db.joinedload(DailyPlan.planned_sites).joinedload(PlannedSite.site)
-    )
-    
-    # Rest of your code remains the same
-    if current_user.role == 'enom':
-        query = query.filter_by(enom_user_id=current_user.id)
-    elif current_user.role != 'tsel':
-        flash('Unauthorized access', 'danger')
-        return redirect(url_for('main.index'))
+
+    query = plans_scoped_to_current_user(DailyPlan.query)
     
     if date_filter:
         query = query.filter_by(plan_date=datetime.strptime(date_filter, '%Y-%m-%d').date())
@@ -637,6 +640,21 @@ def list_plans():
         query = query.filter_by(status=PlanStatus[status_filter])
     if enom_user_filter and current_user.role == 'tsel':
         query = query.filter_by(enom_user_id=int(enom_user_filter))
+
+    return query
+
+@bp.route('/plans', methods=['GET'])
+@login_required
+def list_plans():
+    if current_user.role not in ('enom', 'tsel'):
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('main.index'))
+
+    # Base query with eager loading
+    query = filtered_plan_query().options(
+        db.joinedload(DailyPlan.enom_user),
+        db.joinedload(DailyPlan.planned_sites).joinedload(PlannedSite.site)
+    )
     
     # Get ENOM users for filter dropdown
     enom_users = None
@@ -650,7 +668,18 @@ def list_plans():
                          plans=plans,
                          statuses=PlanStatus,
                          enom_users=enom_users,
-                         today=today)
+                         today=today,
+                         export_formats=export.available_formats())
+
+@bp.route('/plans/export', methods=['GET'])
+@login_required
+def export_plans():
+    if current_user.role not in ('enom', 'tsel'):
+        abort(403)
+    if request.args.get('format', 'csv') not in export.available_formats():
+        abort(400)
+    header, rows = export.plan_rows(filtered_plan_query())
+    return export_response('plans', header, rows)
 
 @bp.route('/plans/new', methods=['GET', 'POST'])
 @login_required
@@ -663,50 +692,30 @@ def create_plan():
         action = request.form.get('action')
         try:
             plan_date = datetime.strptime(request.form['plan_date'], '%Y-%m-%d').date()
-            if action == 'draft':
-
-                new_plan = DailyPlan(
-                    enom_user_id=current_user.id,
-                    plan_date=plan_date,
-                    status=PlanStatus.DRAFT
-                )
-                db.session.add(new_plan)
-                db.session.commit()
-            elif action == 'submit':
-                new_plan = DailyPlan(
-                    enom_user_id=current_user.id,
-                    plan_date=plan_date,
-                    status=PlanStatus.SUBMITTED
+            status = PlanStatus.SUBMITTED if action == 'submit' else PlanStatus.DRAFT
+
+            # Planned sites parsed by the page into parallel lists
+            rows = [
+                plan_import.planned_site(plan_date, site_id, planned_actions, assignee, int(visit_order), int(duration))
+                for site_id, planned_actions, visit_order, duration, assignee in zip(
+                    request.form.getlist('site_id[]'),
+                    request.form.getlist('planned_actions[]'),
+                    request.form.getlist('visit_order[]'),
+                    request.form.getlist('duration[]'),
+                    request.form.getlist('assignee[]')
                 )
-                db.session.add(new_plan)
-                db.session.commit()
-
-            # Add planned sites
-            site_ids = request.form.getlist('site_id[]')
-            actions = request.form.getlist('planned_actions[]')
-            visit_orders = request.form.getlist('visit_order[]')
-            durations = request.form.getlist('duration[]')
-            assignees = request.form.getlist('assignee[]')
-            
-            for i in range(len(site_ids)):
-                # Get site by site_id
-                site = Site.query.filter_by(site_id=site_ids[i]).first()
-                if site:
-                    planned_site = PlannedSite(
-                        daily_plan_id=new_plan.id,
-                        site_id=site.id,
-                        planned_actions=actions[i],
-                        visit_order=visit_orders[i],
-                        estimated_duration=durations[i],
-                        assignee=assignees[i]
-                    )
-                    db.session.add(planned_site)
-            
+            ]
+            site_ids, unknown = plan_import.resolve_sites(rows)
+            new_plan, = plan_import.create_plans(current_user.id, rows, site_ids, status, plan_dates=[plan_date])
             db.session.commit()
+            dashboard_cache.invalidate(PLANS)
             flash('Plan created successfully', 'success')
+            if unknown:
+                flash(f"Skipped unknown site IDs: {', '.join(unknown)}", 'warning')
             return redirect(url_for('main.view_plan', plan_id=new_plan.id))
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error creating plan: {str(e)}")
             flash('Failed to create plan', 'danger')
             flash(str(e))
@@ -714,6 +723,57 @@ def create_plan():
             
     return render_template('plans/create.html')
 
+@bp.route('/plans/import', methods=['GET', 'POST'])
+@login_required
+def import_plans():
+    """Many planned sites, for one or more dates, from pasted text or a CSV file"""
+    if not all(is_safe_string(v) for v in request.form.values()):
+        abort(400)
+
+    if current_user.role != 'enom':
+        flash('Only ENOM users can create plans', 'danger')
+        return redirect(url_for('main.list_plans'))
+
+    context = {'plan_text': '', 'plan_date': datetime.now(jakarta_tz).date().isoformat(), 'rows': [], 'unknown': []}
+    if request.method == 'GET':
+        return render_template('plans/import.html', **context)
+
+    action = request.form.get('action')
+    context['plan_text'] = request.form.get('plan_text', '')
+    upload = request.files.get('file')
+    if upload and upload.filename:
+        context['plan_text'] = upload.read().decode('utf-8-sig', errors='replace')
+    context['plan_date'] = request.form.get('plan_date') or context['plan_date']
+
+    try:
+        plan_date = datetime.strptime(context['plan_date'], '%Y-%m-%d').date()
+        rows = plan_import.parse(context['plan_text'], plan_date)
+    except ValueError as e:
+        return render_template('plans/import.html', error=str(e), **context), 400
+
+    site_ids, unknown = plan_import.resolve_sites(rows)
+    context.update(rows=rows, unknown=unknown)
+    if not rows:
+        return render_template('plans/import.html', error='No planned sites found', **context), 400
+    if unknown:
+        # Nothing is written until every site ID is known
+        return render_template('plans/import.html', **context), 400
+    if action not in ('draft', 'submit'):
+        return render_template('plans/import.html', **context)
+
+    status = PlanStatus.SUBMITTED if action == 'submit' else PlanStatus.DRAFT
+    try:
+        plans = plan_import.create_plans(current_user.id, rows, site_ids, status)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error importing plans: {str(e)}")
+        return render_template('plans/import.html', error='Failed to import plans', **context), 500
+
+    dashboard_cache.invalidate(PLANS)
+    flash(f"Imported {len(plans)} plans with {len(rows)} planned sites", 'success')
+    return redirect(url_for('main.list_plans'))
+
 @bp.route('/plans/<int:plan_id>/submit', methods=['POST'])
 @login_required
 def submit_plan(plan_id):
@@ -727,6 +787,8 @@ def submit_plan(plan_id):
         
     plan.status = PlanStatus.SUBMITTED
     db.session.commit()
+    dashboard_cache.invalidate(PLANS)
+    event_broker.publish(PLAN_SUBMITTED, id=plan.id, enom_user_id=plan.enom_user_id, plan_date=plan.plan_date.isoformat())
     
     flash('Plan submitted for review', 'success')
     return redirect(url_for('main.view_plan', plan_id=plan_id))
@@ -744,6 +806,8 @@ def approve_plan(plan_id):
     plan = DailyPlan.query.get_or_404(plan_id)
     plan.status = PlanStatus.APPROVED
     db.session.commit()
+    dashboard_cache.invalidate(PLANS)
+    event_broker.publish(PLAN_APPROVED, id=plan.id, enom_user_id=plan.enom_user_id, plan_date=plan.plan_date.isoformat())
     
     flash('Plan approved', 'success')
     return redirect(url_for('main.view_plan', plan_id=plan_id))
@@ -791,6 +855,8 @@ def reject_plan(plan_id):
     
     plan.status = PlanStatus.REJECTED
     db.session.commit()
+    dashboard_cache.invalidate(PLANS)
+    event_broker.publish(PLAN_REJECTED, id=plan.id, enom_user_id=plan.enom_user_id, plan_date=plan.plan_date.isoformat())
     
     # Optionally, you can add a comment for the rejection
     comment = PlanComment(
@@ -870,6 +936,7 @@ def edit_plan(plan_id):
                 plan.status = new_status
                 
                 db.session.commit()
+                dashboard_cache.invalidate(PLANS)
                 flash('Plan updated successfully', 'success')
                 return redirect(url_for('main.view_plan', plan_id=plan.id))
                 
@@ -881,6 +948,7 @@ def edit_plan(plan_id):
             try:
                 plan.status = PlanStatus.SUBMITTED
                 db.session.commit()
+                dashboard_cache.invalidate(PLANS)
                 flash('Plan submitted successfully', 'success')
                 return redirect(url_for('main.view_plan', plan_id=plan.id))
             except Exception as e:
@@ -888,8 +956,7 @@ def edit_plan(plan_id):
                 flash(f'Error submitting plan: {str(e)}', 'danger')
                 return redirect(url_for('main.edit_plan', plan_id=plan.id))
 
-    all_sites = Site.query.all()
-    return render_template('plans/edit.html', plan=plan, sites=all_sites)
+    return render_template('plans/edit.html', plan=plan, sites=site_catalog.snapshot())
 
 @bp.route('/plans/<int:plan_id>/delete', methods=['POST'])
 @login_required
@@ -907,6 +974,7 @@ def delete_plan(plan_id):
     try:
         db.session.delete(plan)
         db.session.commit()
+        dashboard_cache.invalidate(PLANS)
         flash('Plan deleted successfully', 'success')
     except Exception as e:
         logger.error(f"Error deleting plan: {str(e)}")
@@ -920,6 +988,133 @@ def get_sites_count():
     count = Site.query.count()
     return jsonify({'count': count})
 
+@bp.route('/api/map/sites')
+@login_required
+@limiter.limit("60 per minute", key_func=get_user_or_ip)
+def map_sites():
+    collection = dashboard_cache.get_or_compute('site_markers', TICKETS, 'all', site_markers_geojson)
+    body = json.dumps(collection, separators=(',', ':'))
+
+    # Cached by the browser but revalidated on every poll; unchanged data costs a 304
+    response = current_app.response_class(body, mimetype='application/geo+json')
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@bp.route('/api/stats/trend')
+@login_required
+def get_trend():
+    try:
+        end = request.args.get('end')
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now(jakarta_tz).date()
+        start = request.args.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+    if (end - start).days > MAX_TREND_DAYS:
+        return jsonify({'error': f'Range is limited to {MAX_TREND_DAYS} days'}), 400
+
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in trends.BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(trends.BUCKETS)}"}), 400
+
+    category = request.args.get('category')
+    if category and category not in ProblemCategory.__members__:
+        return jsonify({'error': 'Invalid category'}), 400
+    assignee = request.args.get('assignee')
+    if assignee and assignee not in EnomAssignee.__members__:
+        return jsonify({'error': 'Invalid assignee'}), 400
+    site_id = request.args.get('site', type=int)
+    kabupaten = request.args.get('kabupaten')
+
+    effective, labels, data = trends.ticket_trend(
+        start, end, bucket,
+        category=category,
+        site_id=site_id,
+        kabupaten=kabupaten,
+        assignee=assignee
+    )
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': effective,
+        'requested_bucket': bucket,
+        'labels': labels,
+        'data': data
+    })
+
+@bp.route('/api/stats/resolution')
+@login_required
+def get_resolution_metrics():
+    try:
+        end = request.args.get('end')
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now(jakarta_tz).date()
+        start = request.args.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+
+    group_by = request.args.get('group_by') or None
+    if group_by and group_by not in metrics.GROUPINGS:
+        return jsonify({'error': f"group_by must be one of {', '.join(metrics.GROUPINGS)}"}), 400
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+        'unit': 'hours',
+        'results': metrics.resolution_metrics(start, end, group_by)
+    })
+
+@bp.route('/api/events')
+@login_required
+# Each tab reconnects every SSE_MAX_STREAM_SECONDS, and an EventSource given a 429 never retries
+@limiter.limit("600 per hour", key_func=get_user_or_ip)
+def event_stream():
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    max_duration = current_app.config['SSE_MAX_STREAM_SECONDS']
+
+    # Read before the generator runs outside the request context
+    role, user_id = current_user.role, current_user.id
+    enom = current_user.username.split('_')[0].upper() if role == 'enom' else None
+
+    # The stream never touches the database, so give the connection back to the pool now
+    db.session.close()
+
+    def generate():
+        deadline = time.monotonic() + max_duration
+        # Reconnect quickly after the stream is closed at the deadline
+        yield "retry: 2000\n\n"
+        for message in event_broker.listen(heartbeat):
+            if message is None:
+                yield ": heartbeat\n\n"
+            else:
+                # Scoped like the list queries, so ENOM users only hear about their own tickets and plans
+                message = visible_to(message, role, enom, user_id)
+                if message is not None:
+                    yield f"data: {message}\n\n"
+            if time.monotonic() >= deadline:
+                break
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop Nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/cache/stats')
+@login_required
+def get_cache_stats():
+    if current_user.role != 'tsel':
+        abort(403)
+    return jsonify(dashboard_cache.stats())
+
 @bp.route('/tickets/<int:ticket_id>/delete', methods=['POST'])
 @login_required
 def delete_ticket(ticket_id):
@@ -932,10 +1127,16 @@ def delete_ticket(ticket_id):
             'message': 'Only TSEL users can delete tickets'
         }), 403
         
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = locked_ticket_or_404(ticket_id)
     try:
+        deleted = ticket_data(ticket)
+        photo_hashes = photo_store.photo_hashes([ticket_id])
+        rollup.record(before=[rollup.snapshot(ticket)])
         db.session.delete(ticket)
         db.session.commit()
+        photo_store.release(photo_hashes)
+        dashboard_cache.invalidate(TICKETS)
+        event_broker.publish(TICKET_DELETED, **deleted)
         return jsonify({
             'success': True,
             'message': 'Ticket deleted successfully'
@@ -947,10 +1148,56 @@ def delete_ticket(ticket_id):
             'message': str(e)
         }), 500
 
+@bp.route('/tickets/bulk', methods=['POST'])
+@login_required
+def bulk_update_tickets():
+    if current_user.role != 'tsel':
+        return jsonify({
+            'success': False,
+            'message': 'Only TSEL users can change tickets in bulk'
+        }), 403
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        operation, value, ticket_ids = bulk.parse(
+            payload.get('operation'), payload.get('value'), payload.get('ticket_ids')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        photo_hashes = photo_store.photo_hashes(ticket_ids) if operation == 'delete' else set()
+        changed = bulk.apply(operation, value, ticket_ids, current_user)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Bulk {operation} of {len(ticket_ids)} tickets failed: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    photo_store.release(photo_hashes)
+
+    if changed:
+        dashboard_cache.invalidate(TICKETS)
+        assignees = [row.assigned_to_enom.name if row.assigned_to_enom else None for row in changed]
+        previous = [row.old_value.name if row.old_value else None for row in changed] if operation == 'assign' else None
+        event_broker.publish(TICKETS_BULK_CHANGED,
+                             operation=operation,
+                             value=value.name if value else None,
+                             ticket_ids=[row.id for row in changed],
+                             assigned_to_enom=assignees,
+                             previous_assigned_to_enom=previous)
+    return jsonify({
+        'success': True,
+        'changed': len(changed),
+        'skipped': len(ticket_ids) - len(changed)
+    })
+
 @bp.after_request
 def add_header(response):
-    response.headers['Content-Type'] = 'text/html; charset=utf-8'
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+    # API responses keep their own content type and caching policy
+    if response.mimetype == 'text/html':
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
     return response
 
 def is_safe_string(v):
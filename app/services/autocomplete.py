@@ -0,0 +1,149 @@
+import bisect
+import re
+import threading
+import time
+from app import logger
+from app.services.sites import site_catalog
+
+PAGE_SIZE = 10
+
+# Separates the searchable fields of a site so no substring spans two of them
+FIELD_SEPARATOR = '\x00'
+# Sorts after every string that starts with a given prefix
+PREFIX_END = chr(0x10ffff)
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class SiteIndex:
+    """Immutable lookup structures over one snapshot of the sites table.
+
+    Prefix lookups bisect sorted key arrays, the flattened form of a prefix
+    trie, over site_id and over every word start in name and kabupaten.
+    Substring lookups take the shortest trigram posting list of the term and
+    verify its candidates, instead of scanning every site.
+    """
+
+    def __init__(self, rows):
+        # Records are kept in site_id order, so a record's position is its tie-breaker
+        rows = sorted(rows, key=lambda row: row.site_id.lower())
+        self.results = []
+        self.site_ids = []
+        self.haystacks = []
+        self.postings = {}
+        word_keys = []
+
+        for position, row in enumerate(rows):
+            self.results.append({
+                'id': row.id,
+                'text': f'{row.site_id} - {row.name}',
+                'site_id': row.site_id,
+                'name': row.name,
+                'kabupaten': row.kabupaten
+            })
+            site_id = row.site_id.lower()
+            name = row.name.lower()
+            kabupaten = row.kabupaten.lower()
+            self.site_ids.append(site_id)
+
+            for field in (name, kabupaten):
+                for word in re.finditer(r'\w+', field):
+                    word_keys.append((field[word.start():], position))
+
+            haystack = FIELD_SEPARATOR.join((site_id, name, kabupaten))
+            self.haystacks.append(haystack)
+            for gram in trigrams(haystack):
+                self.postings.setdefault(gram, []).append(position)
+
+        word_keys.sort()
+        self.word_keys = [key for key, _ in word_keys]
+        self.word_positions = [position for _, position in word_keys]
+
+    def __len__(self):
+        return len(self.results)
+
+    def match(self, term, limit):
+        """Positions of the first `limit` records matching `term` (lowercase), best first.
+
+        Tiers are walked in rank order and each is only read as far as the
+        page needs, so broad terms cost no more than narrow ones.
+        """
+        if not term:
+            return list(range(min(limit, len(self.results))))
+
+        site_id_matches = self._prefixed(self.site_ids, None, term)
+        tiers = [site_id_matches]
+        if site_id_matches and self.site_ids[site_id_matches[0]] == term:
+            # bisect puts an exact match first among the site_id prefix matches
+            tiers = [site_id_matches[:1], site_id_matches[1:]]
+        tiers.append(sorted(self._prefixed(self.word_keys, self.word_positions, term)))
+        # Shorter terms have no trigram to look up and only match as prefixes
+        if len(term) >= 3:
+            tiers.append(self._containing(term))
+
+        positions = []
+        seen = set()
+        for tier in tiers:
+            for position in tier:
+                if position not in seen:
+                    seen.add(position)
+                    positions.append(position)
+                    if len(positions) == limit:
+                        return positions
+        return positions
+
+    def _prefixed(self, keys, positions, term):
+        start = bisect.bisect_left(keys, term)
+        end = bisect.bisect_left(keys, term + PREFIX_END, start)
+        if positions is None:
+            return range(start, end)
+        return positions[start:end]
+
+    def _containing(self, term):
+        candidates = None
+        for gram in trigrams(term):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return ()
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+        return (position for position in candidates if term in self.haystacks[position])
+
+
+class SiteAutocomplete:
+    """Site lookups for the Select2 boxes, answered from an in-process SiteIndex.
+
+    The index is rebuilt whenever the site catalog moves to a new version.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def search(self, term, page=1, per_page=PAGE_SIZE):
+        """Return (results, more) for one page of sites matching `term`"""
+        index = self._current()
+        start = (page - 1) * per_page
+        # One extra match tells Select2 whether to offer another page
+        positions = index.match(term.strip().lower().replace(FIELD_SEPARATOR, ''), start + per_page + 1)
+        return [index.results[p] for p in positions[start:start + per_page]], len(positions) > start + per_page
+
+    def _current(self):
+        snapshot = site_catalog.snapshot()
+        if self._version == snapshot.version:
+            return self._index
+
+        with self._lock:
+            if self._version != snapshot.version:
+                started = time.perf_counter()
+                self._index = SiteIndex(snapshot)
+                self._version = snapshot.version
+                logger.info(f"Built site index for catalog v{snapshot.version} in "
+                            f"{(time.perf_counter() - started) * 1000:.1f}ms")
+        return self._index
+
+
+site_autocomplete = SiteAutocomplete()
@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+from sqlalchemy import delete, insert, select, update
+from app import db
+from app.models import EnomAssignee, ProblemCategory, Ticket, TicketAction, TicketStatus
+from app.services import rollup
+from app.services.tz import jakarta_now
+
+# Upper bound on the ticket IDs one request may touch
+MAX_TICKETS = 5000
+
+# Operation -> (Ticket column it sets, enum of accepted values, audit label)
+OPERATIONS = {
+    'status': (Ticket.status, TicketStatus, 'Status'),
+    'assign': (Ticket.assigned_to_enom, EnomAssignee, 'ENOM assignee'),
+    'category': (Ticket.problem_category, ProblemCategory, 'Category'),
+    'delete': (None, None, None),
+}
+
+# Ticket fields the rollup and live events need, as they are after the change
+RETURNED_COLUMNS = (
+    Ticket.id, Ticket.ticket_number, Ticket.site_id, Ticket.problem_category,
+    Ticket.assigned_to_enom, Ticket.status, Ticket.created_at, Ticket.closed_at
+)
+
+
+def parse(operation, value, ticket_ids):
+    """Validate a bulk request; returns (operation, enum value or None, ticket ids)"""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+
+    if not isinstance(ticket_ids, list) or not ticket_ids:
+        raise ValueError("ticket_ids must be a non-empty list")
+    if len(ticket_ids) > MAX_TICKETS:
+        raise ValueError(f"At most {MAX_TICKETS} tickets can be changed at once")
+    try:
+        ticket_ids = sorted({int(ticket_id) for ticket_id in ticket_ids})
+    except (TypeError, ValueError):
+        raise ValueError("ticket_ids must be integers")
+
+    _, values, _ = OPERATIONS[operation]
+    if values is None:
+        return operation, None, ticket_ids
+    if value not in values.__members__:
+        raise ValueError(f"Invalid value for {operation}: {value}")
+    return operation, values[value], ticket_ids
+
+
+def apply(operation, value, ticket_ids, user):
+    """Apply one bulk operation in the caller's transaction.
+
+    Tickets are changed with a single set-based UPDATE (or DELETE) that
+    returns their old and new state, which feeds the rollup deltas and the
+    audit TicketActions, inserted with one executemany. Tickets that are
+    missing or already have `value` are skipped. Returns the changed rows.
+    """
+    if operation == 'delete':
+        return _delete(ticket_ids)
+
+    column, _, label = OPERATIONS[operation]
+    now = jakarta_now()
+
+    # Lock the rows and remember what they were, in the same statement as the update
+    old = select(
+        Ticket.id, column.label('old_value'), Ticket.closed_at.label('old_closed_at')
+    ).where(
+        Ticket.id.in_(ticket_ids),
+        column.is_distinct_from(value)
+    ).with_for_update().subquery()
+
+    values = {column.key: value}
+    if operation == 'status':
+        # Same timestamps as a single status update
+        if value == TicketStatus.RESOLVED:
+            values['resolved_at'] = now
+        elif value == TicketStatus.CLOSED:
+            values['closed_at'] = now
+        else:
+            values['resolved_at'] = None
+
+    rows = db.session.execute(
+        update(Ticket).where(Ticket.id == old.c.id).values(**values).returning(
+            *RETURNED_COLUMNS, old.c.old_value, old.c.old_closed_at
+        ).execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        return []
+
+    before, after = [], []
+    for row in rows:
+        fields = dict(row._mapping)
+        after.append(rollup.snapshot(SimpleNamespace(**fields)))
+        fields.update({column.key: row.old_value, 'closed_at': row.old_closed_at})
+        before.append(rollup.snapshot(SimpleNamespace(**fields)))
+    rollup.record(before=before, after=after)
+
+    db.session.execute(insert(TicketAction), [{
+        'ticket_id': row.id,
+        'action_text': f"{label} updated from {_name(row.old_value)} to {value.name} (bulk)",
+        'created_by': user.username,
+        'created_by_id': user.id,
+        'created_at': now
+    } for row in rows])
+
+    return rows
+
+
+def _delete(ticket_ids):
+    db.session.execute(
+        delete(TicketAction).where(TicketAction.ticket_id.in_(ticket_ids)).execution_options(synchronize_session=False)
+    )
+    rows = db.session.execute(
+        delete(Ticket).where(Ticket.id.in_(ticket_ids)).returning(
+            *RETURNED_COLUMNS
+        ).execution_options(synchronize_session=False)
+    ).all()
+    rollup.record(before=[rollup.snapshot(row) for row in rows])
+    return rows
+
+
+def _name(value):
+    return getattr(value, 'name', value) if value is not None else 'none'
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+import redis
+from app import logger
+
+TICKETS = 'tickets'
+PLANS = 'plans'
+
+
+class DashboardCache:
+    """Cache for dashboard payloads, invalidated by ticket and plan writes.
+
+    Every entry belongs to a scope (`TICKETS` or `PLANS`). Writes bump the
+    generation counter of their scope, which makes every entry computed under
+    the previous generation unreachable. Entries live in Redis and are shared
+    by all workers; while Redis is unreachable an in-process LRU is used.
+    Other workers' invalidations never reach that LRU, so its entries expire
+    after `local_ttl` seconds to bound how stale they can get.
+    """
+
+    PREFIX = 'dashboard_cache'
+    # Only reclaims entries orphaned by a generation bump; freshness comes from invalidate()
+    ORPHAN_TTL = 24 * 3600
+    RETRY_AFTER = 30
+
+    def __init__(self, maxsize=256, local_ttl=10):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self._redis = None
+        self._redis_down_until = 0
+        self._recovering = False
+        self._local = OrderedDict()
+        self._local_generations = {}
+        self._local_stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('DASHBOARD_CACHE_SIZE', self.maxsize)
+        self.local_ttl = app.config.get('DASHBOARD_CACHE_LOCAL_TTL', self.local_ttl)
+        self._redis = redis.Redis.from_url(
+            app.config['REDIS_URL'],
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+        app.extensions['dashboard_cache'] = self
+
+    def get_or_compute(self, section, scope, key, compute):
+        """Return the cached payload for `section`/`key`, computing it on a miss.
+
+        `compute` must return a JSON-serializable value.
+        """
+        client = self._client()
+        if client is None:
+            return self._local_get_or_compute(section, scope, key, compute)
+
+        try:
+            generation = int(client.get(self._generation_key(scope)) or 0)
+            cache_key = self._entry_key(section, scope, generation, key)
+            cached = client.get(cache_key)
+            self._count(client, 'hits' if cached is not None else 'misses')
+        except redis.RedisError as e:
+            self._mark_down(e)
+            return self._local_get_or_compute(section, scope, key, compute)
+
+        if cached is not None:
+            return json.loads(cached)
+
+        value = compute()
+        try:
+            client.set(cache_key, json.dumps(value), ex=self.ORPHAN_TTL)
+        except redis.RedisError as e:
+            self._mark_down(e)
+        return value
+
+    def invalidate(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._local_generations[scope] = self._local_generations.get(scope, 0) + 1
+
+        client = self._client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            for scope in scopes:
+                pipe.incr(self._generation_key(scope))
+            pipe.execute()
+        except redis.RedisError as e:
+            self._mark_down(e)
+
+    def stats(self):
+        with self._lock:
+            local = dict(self._local_stats, entries=len(self._local))
+
+        shared = None
+        client = self._client()
+        if client is not None:
+            try:
+                raw = client.hgetall(f"{self.PREFIX}:stats")
+                shared = {k.decode(): int(v) for k, v in raw.items()}
+            except redis.RedisError as e:
+                self._mark_down(e)
+
+        return {
+            'backend': 'redis' if shared is not None else 'local',
+            'shared': shared,
+            'local': local
+        }
+
+    def _local_get_or_compute(self, section, scope, key, compute):
+        with self._lock:
+            generation = self._local_generations.get(scope, 0)
+            cache_key = self._entry_key(section, scope, generation, key)
+            entry = self._local.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._local.move_to_end(cache_key)
+                self._local_stats['hits'] += 1
+                return json.loads(entry[1])
+            self._local_stats['misses'] += 1
+
+        value = compute()
+
+        with self._lock:
+            self._local[cache_key] = (time.monotonic() + self.local_ttl, json.dumps(value))
+            self._local.move_to_end(cache_key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+        return value
+
+    def _client(self):
+        if self._redis is None or time.monotonic() < self._redis_down_until:
+            return None
+
+        if self._recovering:
+            # Invalidations issued while Redis was unreachable were only applied
+            # locally, so nothing cached in Redis before the outage can be trusted
+            try:
+                pipe = self._redis.pipeline()
+                for scope in (TICKETS, PLANS):
+                    pipe.incr(self._generation_key(scope))
+                pipe.execute()
+            except redis.RedisError as e:
+                self._mark_down(e)
+                return None
+            self._recovering = False
+
+        return self._redis
+
+    def _mark_down(self, error):
+        logger.warning(f"Dashboard cache falling back to local LRU: {str(error)}")
+        self._redis_down_until = time.monotonic() + self.RETRY_AFTER
+        self._recovering = True
+
+    def _count(self, client, outcome):
+        with self._lock:
+            self._local_stats[outcome] += 1
+        client.hincrby(f"{self.PREFIX}:stats", outcome, 1)
+
+    def _generation_key(self, scope):
+        return f"{self.PREFIX}:{scope}:generation"
+
+    def _entry_key(self, section, scope, generation, key):
+        return f"{self.PREFIX}:{scope}:{generation}:{section}:{key}"
+
+
+dashboard_cache = DashboardCache()
@@ -0,0 +1,323 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from app import db
+from app.models import (
+    Site, Ticket, TicketDailyStat, TicketStatus, ProblemCategory, EnomAssignee,
+    User, DailyPlan, PlannedSite
+)
+from app.services.trends import ticket_trend
+
+WINDOW_DAYS = 30
+TREND_DAYS = 7
+ACTIVE_STATUSES = (TicketStatus.OPEN, TicketStatus.IN_PROGRESS, TicketStatus.PENDING)
+
+# Age ranges of active tickets on the ENOM dashboard, in days: (label, from, to)
+AGING_BUCKETS = (
+    ('< 1 day', 0, 1),
+    ('1-3 days', 1, 3),
+    ('3-7 days', 3, 7),
+    ('> 7 days', 7, None),
+)
+
+
+@dataclass
+class DashboardStats:
+    status_counts: dict
+    total_30_days: int
+    status_30_days: dict
+    category_distribution: dict
+    assignee_distribution: dict
+    avg_resolution_time: float
+
+
+def build_dashboard_stats(today):
+    """Compute every dashboard counter with one grouped query.
+
+    The query reads the ticket_daily_stats rollup, so its cost depends on
+    the number of days and dimension values rather than on the number of
+    tickets. The query count does not depend on the members of TicketStatus,
+    ProblemCategory or EnomAssignee: rows come back grouped by all three and
+    are folded into the individual distributions here.
+    """
+    recent = TicketDailyStat.stat_date >= today - timedelta(days=WINDOW_DAYS)
+
+    rows = db.session.query(
+        TicketDailyStat.status,
+        TicketDailyStat.problem_category,
+        TicketDailyStat.assigned_to_enom,
+        func.sum(TicketDailyStat.ticket_count).label('total'),
+        func.sum(TicketDailyStat.ticket_count).filter(recent).label('recent'),
+        func.sum(TicketDailyStat.closed_count).filter(recent).label('closed'),
+        func.sum(TicketDailyStat.closed_seconds).filter(recent).label('closed_seconds')
+    ).group_by(
+        TicketDailyStat.status,
+        TicketDailyStat.problem_category,
+        TicketDailyStat.assigned_to_enom
+    ).all()
+
+    status_counts = {status.name: 0 for status in TicketStatus}
+    status_30_days = {status.name: 0 for status in TicketStatus}
+    category_distribution = {category.name: 0 for category in ProblemCategory}
+    assignee_distribution = {member.name: 0 for member in EnomAssignee}
+    total_30_days = 0
+    closed_count = 0
+    closed_seconds = 0.0
+
+    for row in rows:
+        if row.status in status_counts:
+            status_counts[row.status] += row.total
+
+        if not row.recent:
+            continue
+        total_30_days += row.recent
+        if row.status in status_30_days:
+            status_30_days[row.status] += row.recent
+        if row.problem_category in category_distribution:
+            category_distribution[row.problem_category] += row.recent
+        if row.assigned_to_enom in assignee_distribution:
+            assignee_distribution[row.assigned_to_enom] += row.recent
+        closed_count += row.closed or 0
+        closed_seconds += row.closed_seconds or 0
+
+    avg_resolution_time = closed_seconds / closed_count / 3600 if closed_count else 0
+
+    return DashboardStats(
+        status_counts=status_counts,
+        total_30_days=total_30_days,
+        status_30_days=status_30_days,
+        category_distribution=category_distribution,
+        assignee_distribution=assignee_distribution,
+        avg_resolution_time=round(avg_resolution_time, 1)
+    )
+
+
+@dataclass
+class TechnicianStats:
+    status_counts: dict
+    total_30_days: int
+    aging: list
+
+
+def build_technician_stats(today, assignee, now=None):
+    """Counters for the tickets assigned to one ENOM member.
+
+    Status totals come from the rollup and the aging of active tickets from
+    one conditional-aggregate query, so nothing outside the technician's
+    own tickets is read.
+    """
+    rows = db.session.query(
+        TicketDailyStat.status,
+        func.sum(TicketDailyStat.ticket_count).label('total'),
+        func.sum(TicketDailyStat.ticket_count).filter(
+            TicketDailyStat.stat_date >= today - timedelta(days=WINDOW_DAYS)
+        ).label('recent')
+    ).filter(
+        TicketDailyStat.assigned_to_enom == assignee
+    ).group_by(TicketDailyStat.status).all()
+
+    status_counts = {status.name: 0 for status in TicketStatus}
+    total_30_days = 0
+    for row in rows:
+        if row.status in status_counts:
+            status_counts[row.status] += row.total
+        total_30_days += row.recent or 0
+
+    now = now or datetime.utcnow()
+    aging_columns = []
+    for label, lower, upper in AGING_BUCKETS:
+        condition = Ticket.created_at <= now - timedelta(days=lower)
+        if upper is not None:
+            condition = condition & (Ticket.created_at > now - timedelta(days=upper))
+        aging_columns.append(func.count(Ticket.id).filter(condition))
+
+    # Usernames whose prefix is not an EnomAssignee cannot have tickets assigned
+    aging_counts = [0] * len(AGING_BUCKETS)
+    if assignee in EnomAssignee.__members__:
+        aging_counts = db.session.query(*aging_columns).filter(
+            Ticket.assigned_to_enom == EnomAssignee[assignee],
+            Ticket.status.in_(ACTIVE_STATUSES)
+        ).one()
+
+    return TechnicianStats(
+        status_counts=status_counts,
+        total_30_days=int(total_30_days),
+        aging=[[label, count] for (label, _, _), count in zip(AGING_BUCKETS, aging_counts)]
+    )
+
+
+def todays_plan_summary(enom_user_id, today):
+    """Status and site count of an ENOM member's plan for today, or None"""
+    row = db.session.query(
+        DailyPlan.id,
+        DailyPlan.status,
+        func.count(PlannedSite.id).label('site_count')
+    ).outerjoin(
+        PlannedSite,
+        PlannedSite.daily_plan_id == DailyPlan.id
+    ).filter(
+        DailyPlan.enom_user_id == enom_user_id,
+        DailyPlan.plan_date == today
+    ).group_by(DailyPlan.id).first()
+
+    if row is None:
+        return None
+    return {'id': row.id, 'status': row.status.name, 'site_count': row.site_count}
+
+
+def top_sites(today, limit=5):
+    """Sites with the most tickets created in the last 30 days"""
+    ticket_count = func.sum(TicketDailyStat.ticket_count)
+    rows = db.session.query(
+        Site.site_id,
+        Site.name,
+        ticket_count.label('ticket_count')
+    ).join(
+        TicketDailyStat,
+        Site.id == TicketDailyStat.site_id
+    ).filter(
+        TicketDailyStat.stat_date >= today - timedelta(days=WINDOW_DAYS)
+    ).group_by(
+        Site.id
+    ).having(
+        ticket_count > 0
+    ).order_by(
+        ticket_count.desc()
+    ).limit(limit).all()
+
+    return {
+        'site_ids': [site.site_id for site in rows],
+        'site_names': [site.name for site in rows],
+        'ticket_counts': [int(site.ticket_count) for site in rows]
+    }
+
+
+def daily_trend(today):
+    """New tickets per day over the last TREND_DAYS days"""
+    first_day = today - timedelta(days=TREND_DAYS - 1)
+    _, labels, data = ticket_trend(first_day, today, 'day')
+    return {
+        'labels': [date.fromisoformat(label).strftime('%d-%m-%Y') for label in labels],
+        'data': data
+    }
+
+
+def site_markers_geojson():
+    """Sites with active tickets as a GeoJSON FeatureCollection.
+
+    Per-status counts come from one conditional-aggregate query over sites
+    joined to their active tickets.
+    """
+    rows = db.session.query(
+        Site.id,
+        Site.site_id,
+        Site.name,
+        Site.kabupaten,
+        Site.lat,
+        Site.long,
+        *[func.count(Ticket.id).filter(Ticket.status == status).label(status.name)
+          for status in ACTIVE_STATUSES]
+    ).join(
+        Ticket, Site.id == Ticket.site_id
+    ).filter(
+        Ticket.status.in_(ACTIVE_STATUSES),
+        Site.lat != 0,
+        Site.long != 0
+    ).group_by(Site.id).order_by(Site.id).all()
+
+    features = []
+    for row in rows:
+        status_counts = {status.name: getattr(row, status.name) for status in ACTIVE_STATUSES}
+        features.append({
+            'type': 'Feature',
+            'id': row.id,
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [float(row.long), float(row.lat)]
+            },
+            'properties': {
+                'id': row.id,
+                'site_id': row.site_id,
+                'name': row.name,
+                'kabupaten': row.kabupaten,
+                'ticket_count': sum(status_counts.values()),
+                'status_counts': status_counts,
+                # Ties go to the earliest status in ACTIVE_STATUSES
+                'status': max(status_counts, key=status_counts.get)
+            }
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def top_planned_sites(today, limit=10):
+    """Most visited sites in the plans of the last two weeks"""
+    two_weeks_ago = today - timedelta(days=14)
+    rows = db.session.query(
+        Site.site_id,
+        Site.name,
+        func.count(PlannedSite.id).label('visit_count')
+    ).join(
+        PlannedSite,
+        Site.id == PlannedSite.site_id
+    ).join(
+        DailyPlan,
+        PlannedSite.daily_plan_id == DailyPlan.id
+    ).filter(
+        DailyPlan.plan_date >= two_weeks_ago,
+        DailyPlan.plan_date <= today
+    ).group_by(
+        Site.id
+    ).order_by(
+        func.count(PlannedSite.id).desc()
+    ).limit(limit).all()
+
+    return {
+        'site_ids': [site.site_id for site in rows],
+        'site_names': [site.name for site in rows],
+        'visit_counts': [site.visit_count for site in rows]
+    }
+
+
+def todays_plans(today):
+    """Every plan for today with its ENOM member and planned sites loaded"""
+    return DailyPlan.query.filter(
+        DailyPlan.plan_date == today
+    ).options(
+        db.joinedload(DailyPlan.enom_user),
+        db.joinedload(DailyPlan.planned_sites).joinedload(PlannedSite.site)
+    ).all()
+
+
+def planned_markers(today):
+    """Map markers for the sites planned for today"""
+    todays_planned_sites = db.session.query(
+        Site,
+        DailyPlan.enom_user_id,
+        User.username.label('enom_username'),
+        PlannedSite.planned_actions,
+        PlannedSite.estimated_duration
+    ).join(
+        PlannedSite,
+        Site.id == PlannedSite.site_id
+    ).join(
+        DailyPlan,
+        PlannedSite.daily_plan_id == DailyPlan.id
+    ).join(
+        User,
+        DailyPlan.enom_user_id == User.id
+    ).filter(
+        DailyPlan.plan_date == today
+    ).all()
+
+    return [{
+        'id': site.Site.id,
+        'site_id': site.Site.site_id,
+        'name': site.Site.name,
+        'kabupaten': site.Site.kabupaten,
+        'lat': float(site.Site.lat),
+        'long': float(site.Site.long),
+        'enom_username': site.enom_username,
+        'planned_actions': site.planned_actions,
+        'estimated_duration': site.estimated_duration
+    } for site in todays_planned_sites if site.Site.lat and site.Site.long]
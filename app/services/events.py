@@ -0,0 +1,167 @@
+import json
+import queue
+import threading
+import time
+import redis
+from app import logger
+
+TICKET_CREATED = 'ticket_created'
+TICKET_STATUS_CHANGED = 'ticket_status_changed'
+TICKET_DELETED = 'ticket_deleted'
+TICKETS_BULK_CHANGED = 'tickets_bulk_changed'
+ACTION_ADDED = 'action_added'
+PLAN_SUBMITTED = 'plan_submitted'
+PLAN_APPROVED = 'plan_approved'
+PLAN_REJECTED = 'plan_rejected'
+
+TICKET_EVENTS = (TICKET_CREATED, TICKET_STATUS_CHANGED, TICKET_DELETED, ACTION_ADDED)
+PLAN_EVENTS = (PLAN_SUBMITTED, PLAN_APPROVED, PLAN_REJECTED)
+
+
+class EventBroker:
+    """Fan-out of live update events to Server-Sent Events streams.
+
+    With `EVENT_BROKER = 'redis'` events travel over a Redis pub/sub channel
+    and reach the streams of every worker. With `'local'` they are delivered
+    to the streams of the current process only, which suits a single-worker
+    deployment without Redis.
+    """
+
+    CHANNEL = 'live_events'
+    # Slow clients are dropped instead of growing their queue without bound
+    LOCAL_QUEUE_SIZE = 100
+
+    def __init__(self):
+        self.backend = 'local'
+        self._redis = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.backend = app.config.get('EVENT_BROKER', 'redis')
+        if self.backend == 'redis':
+            self._redis = redis.Redis.from_url(
+                app.config['REDIS_URL'],
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+        app.extensions['event_broker'] = self
+
+    def publish(self, event_type, **data):
+        """Send an event to every open stream; call after the change has committed"""
+        message = json.dumps({'type': event_type, 'data': data, 'ts': time.time()})
+
+        if self.backend != 'redis':
+            self._deliver_local(message)
+            return
+        try:
+            self._redis.publish(self.CHANNEL, message)
+        except redis.RedisError as e:
+            # Clients resynchronise from the widget endpoints when they reconnect
+            logger.warning(f"Dropping live event {event_type}: {str(e)}")
+
+    def listen(self, timeout):
+        """Yield event messages, or None after `timeout` seconds without one.
+
+        The generator ends when the broker connection is lost; streams should
+        close so the browser reconnects.
+        """
+        if self.backend == 'redis':
+            return self._listen_redis(timeout)
+        return self._listen_local(timeout)
+
+    def _listen_redis(self, timeout):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.CHANNEL)
+            while True:
+                message = pubsub.get_message(timeout=timeout)
+                if message is None:
+                    yield None
+                elif message['type'] == 'message':
+                    yield message['data'].decode()
+        except redis.RedisError as e:
+            logger.warning(f"Live event stream lost its Redis subscription: {str(e)}")
+        finally:
+            pubsub.close()
+
+    def _listen_local(self, timeout):
+        subscriber = queue.Queue(maxsize=self.LOCAL_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            while True:
+                try:
+                    message = subscriber.get(timeout=timeout)
+                except queue.Empty:
+                    yield None
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def _deliver_local(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+        # Wake the stream up so it ends and the client reconnects
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
+
+
+def ticket_data(ticket):
+    """Fields of a ticket that clients need to patch counters and markers"""
+    return {
+        'id': ticket.id,
+        'ticket_number': ticket.ticket_number,
+        'site_id': int(ticket.site_id),
+        'status': ticket.status.name if ticket.status else None,
+        'assigned_to_enom': ticket.assigned_to_enom.name if ticket.assigned_to_enom else None
+    }
+
+
+def visible_to(message, role, enom, user_id):
+    """The event `message` as a subscriber may see it, or None.
+
+    ENOM users get the same view as their list pages: events for tickets
+    assigned to their company (`enom`) and for their own plans. Bulk events
+    are cut down to the tickets they can see.
+    """
+    if role != 'enom':
+        return message
+
+    event = json.loads(message)
+    data = event['data']
+    if event['type'] in TICKET_EVENTS:
+        return message if data.get('assigned_to_enom') == enom else None
+    if event['type'] in PLAN_EVENTS:
+        return message if data.get('enom_user_id') == user_id else None
+    if event['type'] == TICKETS_BULK_CHANGED:
+        # A reassigned ticket is news to the company that had it as well
+        previous = data.get('previous_assigned_to_enom') or data['assigned_to_enom']
+        visible = [i for i, assignees in enumerate(zip(data['assigned_to_enom'], previous)) if enom in assignees]
+        if not visible:
+            return None
+        for field in ('ticket_ids', 'assigned_to_enom', 'previous_assigned_to_enom'):
+            if data.get(field) is not None:
+                data[field] = [data[field][i] for i in visible]
+        return json.dumps(event)
+    return None
+
+
+event_broker = EventBroker()
@@ -0,0 +1,170 @@
+import csv
+import io
+import tempfile
+from datetime import date, datetime
+from enum import Enum
+from sqlalchemy import Numeric, cast, func
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import DailyPlan, PlannedSite, Site, Ticket, TicketAction, User
+from app.services.tz import to_jakarta
+
+try:
+    import xlsxwriter
+except ImportError:  # XLSX export is unavailable without it
+    xlsxwriter = None
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Rows fetched per round trip from the server-side cursor
+YIELD_PER = 1000
+# CSV rows buffered into each chunk sent to the client
+CSV_CHUNK_ROWS = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+Assignee = aliased(User)
+PlanOwner = aliased(User)
+
+
+def _hours(column):
+    return func.round(cast(func.extract('epoch', column - Ticket.created_at) / 3600, Numeric), 2)
+
+
+TICKET_COLUMNS = (
+    ('Ticket Number', Ticket.ticket_number),
+    ('Site ID', Site.site_id),
+    ('Site Name', Site.name),
+    ('Kabupaten', Site.kabupaten),
+    ('Tower Owner', Site.tower_owner),
+    ('Category', Ticket.problem_category),
+    ('Status', Ticket.status),
+    ('Description', Ticket.description),
+    ('Created By', Ticket.created_by),
+    ('ENOM Assignee', Ticket.assigned_to_enom),
+    ('Assigned User', Assignee.username),
+    ('TS', Ticket.assigned_to_ts),
+    ('Created At', Ticket.created_at),
+    ('Resolved At', Ticket.resolved_at),
+    ('Closed At', Ticket.closed_at),
+    ('Hours To Resolve', _hours(Ticket.resolved_at)),
+    ('Hours To Close', _hours(Ticket.closed_at)),
+    ('Actions', None),
+)
+
+PLAN_COLUMNS = (
+    ('Plan ID', DailyPlan.id),
+    ('Plan Date', DailyPlan.plan_date),
+    ('Plan Status', DailyPlan.status),
+    ('ENOM User', PlanOwner.username),
+    ('Visit Order', PlannedSite.visit_order),
+    ('Site ID', Site.site_id),
+    ('Site Name', Site.name),
+    ('Kabupaten', Site.kabupaten),
+    ('TS', PlannedSite.assignee),
+    ('Estimated Minutes', PlannedSite.estimated_duration),
+    ('Planned Actions', PlannedSite.planned_actions),
+    ('Updated Actions', PlannedSite.updated_actions),
+    ('Created At', DailyPlan.created_at),
+    ('Updated At', DailyPlan.updated_at),
+)
+
+
+def _cell(value):
+    """Spreadsheet-friendly value: enum names, Jakarta timestamps, plain numbers"""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return to_jakarta(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (str, int, float)):
+        return float(value)
+    return value
+
+
+def _stream(query):
+    for row in query.yield_per(YIELD_PER):
+        yield [_cell(value) for value in row]
+
+
+def ticket_rows(query):
+    """Header and row iterator for a filtered Ticket query, newest first.
+
+    Rows come from a server-side cursor, so memory use does not depend on
+    the size of the export. Action counts are aggregated once and joined in.
+    """
+    action_counts = db.session.query(
+        TicketAction.ticket_id, func.count(TicketAction.id).label('actions')
+    ).group_by(TicketAction.ticket_id).subquery()
+
+    columns = [column for _, column in TICKET_COLUMNS if column is not None]
+    query = query.with_entities(
+        *columns, func.coalesce(action_counts.c.actions, 0)
+    ).join(
+        Site, Site.id == Ticket.site_id
+    ).outerjoin(
+        Assignee, Assignee.id == Ticket.assigned_to_id
+    ).outerjoin(
+        action_counts, action_counts.c.ticket_id == Ticket.id
+    ).order_by(Ticket.created_at.desc(), Ticket.id.desc())
+
+    return [header for header, _ in TICKET_COLUMNS], _stream(query)
+
+
+def plan_rows(query):
+    """Header and row iterator for a filtered DailyPlan query, one row per planned site"""
+    query = query.with_entities(
+        *(column for _, column in PLAN_COLUMNS)
+    ).join(
+        PlanOwner, PlanOwner.id == DailyPlan.enom_user_id
+    ).outerjoin(
+        PlannedSite, PlannedSite.daily_plan_id == DailyPlan.id
+    ).outerjoin(
+        Site, Site.id == PlannedSite.site_id
+    ).order_by(DailyPlan.plan_date.desc(), DailyPlan.id.desc(), PlannedSite.visit_order)
+
+    return [header for header, _ in PLAN_COLUMNS], _stream(query)
+
+
+def csv_chunks(header, rows):
+    buffer = io.StringIO()
+    # Byte order mark so Excel opens the file as UTF-8
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(header, rows, sheet_name):
+    """Write the rows to a temporary workbook, then stream the file.
+
+    XLSX is a zip archive that can only be sent once complete. constant_memory
+    mode flushes every row to disk as it is written, so memory stays flat.
+    """
+    with tempfile.TemporaryFile() as spool:
+        workbook = xlsxwriter.Workbook(spool, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, header, workbook.add_format({'bold': True}))
+        for index, row in enumerate(rows, 1):
+            worksheet.write_row(index, 0, row)
+        workbook.close()
+
+        spool.seek(0)
+        while True:
+            chunk = spool.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def available_formats():
+    return ('csv', 'xlsx') if xlsxwriter is not None else ('csv',)
@@ -0,0 +1,67 @@
+from sqlalchemy import func, or_
+from app import db
+from app.models import Site, Ticket
+
+# Dimensions resolution metrics can be broken down by
+GROUPINGS = {
+    'category': Ticket.problem_category,
+    'site': Site.site_id,
+    'kabupaten': Site.kabupaten,
+    'tower_owner': Site.tower_owner,
+    'assignee': Ticket.assigned_to_enom,
+}
+
+PERCENTILES = (('median', 0.5), ('p90', 0.9), ('p95', 0.95))
+
+# Ticket timestamp each measure runs to, starting from created_at
+MEASURES = (('resolve', Ticket.resolved_at), ('close', Ticket.closed_at))
+
+
+def _hours(column):
+    return func.extract('epoch', column - Ticket.created_at) / 3600
+
+
+def resolution_metrics(start, end, group_by=None):
+    """Time-to-resolve and time-to-close statistics in hours.
+
+    Covers tickets created on Jakarta days `start` through `end`. Count, mean
+    and percentile_cont percentiles are computed in one aggregate query,
+    optionally per value of one of GROUPINGS. Tickets still missing a
+    timestamp are ignored by the aggregates of that measure only.
+    """
+    aggregates = []
+    for name, column in MEASURES:
+        hours = _hours(column)
+        aggregates.append(func.count(column).label(f'{name}_count'))
+        aggregates.append(func.avg(hours).label(f'{name}_mean'))
+        for label, fraction in PERCENTILES:
+            aggregates.append(
+                func.percentile_cont(fraction).within_group(hours).label(f'{name}_{label}')
+            )
+
+    dimension = GROUPINGS[group_by] if group_by else None
+    columns = [dimension.label('group')] if dimension is not None else []
+
+    query = db.session.query(*columns, *aggregates).filter(
+        Ticket.local_date >= start,
+        Ticket.local_date <= end,
+        or_(Ticket.resolved_at.isnot(None), Ticket.closed_at.isnot(None))
+    )
+    if group_by in ('site', 'kabupaten', 'tower_owner'):
+        query = query.join(Site, Site.id == Ticket.site_id)
+    if dimension is not None:
+        query = query.group_by(dimension).order_by(dimension)
+
+    results = []
+    for row in query.all():
+        entry = {}
+        if dimension is not None:
+            entry['group'] = getattr(row.group, 'name', row.group)
+        for name, _ in MEASURES:
+            stats = {'count': getattr(row, f'{name}_count')}
+            for label in ('mean',) + tuple(label for label, _ in PERCENTILES):
+                value = getattr(row, f'{name}_{label}')
+                stats[label] = round(float(value), 1) if value is not None else None
+            entry[f'time_to_{name}'] = stats
+        results.append(entry)
+    return results
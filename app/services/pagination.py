@@ -0,0 +1,111 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import func, select, text, tuple_
+from app import db
+
+# Below this estimate the planner is too unreliable and an exact count is cheap
+EXACT_COUNT_THRESHOLD = 1000
+
+
+class KeysetPage:
+    """One page of a query paginated on (created_at, id), newest first"""
+
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Filled in by callers that show a total, see approximate_count()
+        self.total = None
+        self.total_is_estimate = False
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(row, direction):
+    payload = json.dumps([row.created_at.isoformat(), row.id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id, direction); raises ValueError for a malformed cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(created_at)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if not isinstance(row_id, int) or direction not in ('next', 'prev'):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id, direction
+
+
+def keyset_paginate(query, model, per_page, cursor=None):
+    """Fetch the page after or before `cursor` with a row-value range scan.
+
+    Every page costs the same as the first one: the cursor is turned into a
+    (created_at, id) comparison served by the matching index, instead of an
+    OFFSET that reads and discards all earlier rows.
+    """
+    key = tuple_(model.created_at, model.id)
+    direction = 'next'
+    if cursor:
+        created_at, row_id, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(key < tuple_(created_at, row_id))
+        else:
+            query = query.filter(key > tuple_(created_at, row_id))
+
+    if direction == 'next':
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+
+    # One extra row tells whether another page follows in this direction
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == 'prev' or has_more:
+            next_cursor = encode_cursor(rows[-1], 'next')
+        if (direction == 'next' and cursor) or (direction == 'prev' and has_more):
+            prev_cursor = encode_cursor(rows[0], 'prev')
+
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+def approximate_count(query):
+    """Return (count, is_estimate) for `query`, using planner statistics.
+
+    Unfiltered queries read reltuples from pg_class; filtered ones use the
+    row estimate from EXPLAIN. Small estimates are replaced by an exact count.
+    """
+    statement = query.order_by(None).statement
+    if statement.whereclause is None and len(statement.get_final_froms()) == 1:
+        table = statement.get_final_froms()[0]
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {'table': table.name}
+        ).scalar()
+    else:
+        # Percent signs come out doubled for the driver, which undoes that on execution
+        compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}").scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = plan[0]['Plan']['Plan Rows']
+
+    # reltuples is -1 for a table that has never been analyzed
+    if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+        return db.session.execute(select(func.count()).select_from(statement.subquery())).scalar(), False
+    return int(estimate), True
@@ -0,0 +1,306 @@
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import quote
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+from sqlalchemy import func, select, update
+from app import db, logger
+from app.models import TicketAction
+
+# photo_path values are URL paths under the upload folder, e.g. uploads/ab/cd/<sha256>.jpg
+URL_PREFIX = 'uploads'
+# Two levels of two hex digits: 65536 directories, each holding a few files
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+# Uploads are spooled here, on the same filesystem, before being renamed into place
+INCOMING_DIR = '.incoming'
+CHUNK_SIZE = 64 * 1024
+FILE_MODE = 0o640
+DIR_MODE = 0o750
+
+# A content-addressed name never points at different bytes, so browsers keep it for a year
+IMMUTABLE_CACHE = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'private, no-cache'
+
+_CONTENT_ADDRESSED = re.compile(
+    r'^(?:[0-9a-f]{%d}/){%d}([0-9a-f]{64})(?:\.[0-9a-z.]+)?$' % (SHARD_WIDTH, SHARD_DEPTH)
+)
+
+
+def upload_folder():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def relative_name(photo_path):
+    """Path of a stored photo relative to the upload folder"""
+    return photo_path[len(URL_PREFIX) + 1:] if photo_path.startswith(URL_PREFIX + '/') else photo_path
+
+
+def shard_path(sha256, extension):
+    shards = [sha256[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+    name = f"{sha256}.{extension}" if extension else sha256
+    return os.path.join(*shards, name)
+
+
+def content_hash(name):
+    """SHA-256 of a content-addressed photo or variant name relative to the upload folder, or None"""
+    match = _CONTENT_ADDRESSED.match(name)
+    if match is None:
+        return None
+    sha256 = match.group(1)
+    return sha256 if os.path.dirname(name) == os.path.dirname(shard_path(sha256, '')) else None
+
+
+def extension_of(filename):
+    _, extension = os.path.splitext(filename or '')
+    return extension[1:].lower()
+
+
+def allowed_extension(filename):
+    """Lower-case extension of an uploaded file name; raises ValueError if not an allowed image type"""
+    extension = extension_of(filename)
+    if extension not in current_app.config['ALLOWED_EXTENSIONS']:
+        raise ValueError(f"Unsupported photo type: {extension or 'none'}")
+    return extension
+
+
+def incoming_dir():
+    incoming = os.path.join(upload_folder(), INCOMING_DIR)
+    os.makedirs(incoming, mode=DIR_MODE, exist_ok=True)
+    return incoming
+
+
+def incoming_file():
+    """Open a new temporary file in the incoming directory; the caller renames or removes it"""
+    return tempfile.NamedTemporaryFile(dir=incoming_dir(), delete=False)
+
+
+def lock(sha256):
+    """Hold a lock on a photo hash until the session's transaction ends.
+
+    Placing a photo and committing the action that references it happen
+    under this lock, and so does the reference check in release(). A file
+    another request is about to share is therefore never removed.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(select(func.pg_advisory_xact_lock(int(sha256[:15], 16))))
+
+
+def store(upload):
+    """Save an uploaded FileStorage by content; returns (photo_path, sha256).
+
+    The file is hashed while it is copied to disk, so it is read only once.
+    If the same photo is already stored, the copy is dropped and the
+    existing file is shared. The hash stays locked until the caller's
+    transaction ends, so the action referencing it must be committed in
+    that transaction.
+    """
+    extension = allowed_extension(upload.filename)
+    digest = hashlib.sha256()
+    with incoming_file() as spool:
+        try:
+            for chunk in iter(lambda: upload.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                spool.write(chunk)
+        except Exception:
+            os.unlink(spool.name)
+            raise
+    sha256 = digest.hexdigest()
+    try:
+        lock(sha256)
+    except Exception:
+        os.unlink(spool.name)
+        raise
+    return place(spool.name, sha256, extension), sha256
+
+
+def place(source, sha256, extension, keep_source=False):
+    """Move (or with `keep_source`, link) a file into the store; returns its photo_path.
+
+    Call with the hash locked.
+    """
+    relative = shard_path(sha256, extension)
+    target = os.path.join(upload_folder(), relative)
+
+    if os.path.exists(target):
+        if not keep_source:
+            os.unlink(source)
+    else:
+        os.makedirs(os.path.dirname(target), mode=DIR_MODE, exist_ok=True)
+        if keep_source:
+            try:
+                os.link(source, target)
+            except FileExistsError:
+                pass
+            except OSError:
+                # No hard links on this filesystem; copy, then rename into place
+                partial = f"{target}.part"
+                shutil.copyfile(source, partial)
+                os.chmod(partial, FILE_MODE)
+                os.replace(partial, target)
+        else:
+            os.chmod(source, FILE_MODE)
+            os.replace(source, target)
+    return f"{URL_PREFIX}/{relative}"
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def send(name, immutable):
+    """Response for a stored photo, after the caller has checked access.
+
+    With `PHOTO_ACCEL_REDIRECT_PREFIX` set, the worker only returns headers
+    and nginx sends the file from that internal location, Range requests
+    included. Otherwise send_file streams it through the server's file
+    wrapper (sendfile under gunicorn) and answers Range and If-Range itself.
+    Content-addressed names get a strong ETag from the name and immutable
+    caching; other files are revalidated against their mtime and size.
+    """
+    path = safe_join(upload_folder(), name)
+    if path is None or name.startswith(INCOMING_DIR) or not os.path.isfile(path):
+        abort(404)
+
+    if immutable:
+        etag = os.path.basename(name)
+    else:
+        stat = os.stat(path)
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    accel_prefix = current_app.config.get('PHOTO_ACCEL_REDIRECT_PREFIX')
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+    elif accel_prefix:
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(name)}"
+        response.set_etag(etag)
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+    return response
+
+
+def known_variants(photo_path):
+    """(thumb_path, display_path) already made for a stored photo, or (None, None)"""
+    row = db.session.query(TicketAction.thumb_path, TicketAction.display_path).filter(
+        TicketAction.photo_path == photo_path,
+        TicketAction.thumb_path.isnot(None)
+    ).first()
+    return (row.thumb_path, row.display_path) if row else (None, None)
+
+
+def photo_hashes(ticket_ids):
+    """Content hashes of the photos attached to the given tickets"""
+    rows = db.session.query(TicketAction.photo_sha256).filter(
+        TicketAction.ticket_id.in_(ticket_ids),
+        TicketAction.photo_sha256.isnot(None)
+    ).distinct()
+    return {sha256 for (sha256,) in rows}
+
+
+def release(hashes):
+    """Delete the stored photos, and their variants, no action references any more.
+
+    Call after the deleting transaction has committed or rolled back; this
+    runs in a transaction of its own. The reference count is the number of
+    TicketActions sharing a photo_sha256. Hashes are locked first, so an
+    upload of the same photo that is still being saved either finishes
+    before the check, and keeps the file, or waits and stores it again.
+    """
+    if not hashes:
+        return 0
+
+    removed = 0
+    try:
+        # Always in the same order, so two releases cannot deadlock
+        for sha256 in sorted(hashes):
+            lock(sha256)
+        referenced = {sha256 for (sha256,) in db.session.query(TicketAction.photo_sha256).filter(
+            TicketAction.photo_sha256.in_(list(hashes))
+        ).distinct()}
+
+        for sha256 in sorted(set(hashes) - referenced):
+            shard = os.path.dirname(os.path.join(upload_folder(), shard_path(sha256, '')))
+            try:
+                # The photo and every variant named after it
+                for entry in os.scandir(shard):
+                    if entry.name.startswith(sha256):
+                        os.unlink(entry.path)
+                        removed += 1
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Could not remove released photo {sha256}: {str(e)}")
+    finally:
+        # Only read here; ending the transaction releases the locks
+        db.session.rollback()
+    return removed
+
+
+def migrate_legacy(batch_size=100):
+    """Move photos saved under their upload names into the store.
+
+    Files are linked into place first and the old names removed only after
+    the actions pointing at them have been committed, so an interrupted run
+    can simply be repeated. Old variants are dropped; `flask process-photos`
+    makes new ones. Returns (photos moved, photo_paths whose file is missing).
+    """
+    folder = upload_folder()
+    rows = db.session.query(
+        TicketAction.photo_path, TicketAction.thumb_path, TicketAction.display_path
+    ).filter(
+        TicketAction.photo_path.isnot(None),
+        TicketAction.photo_sha256.is_(None)
+    ).distinct().all()
+
+    retired = {}
+    for row in rows:
+        retired.setdefault(row.photo_path, set()).update(
+            path for path in (row.thumb_path, row.display_path) if path
+        )
+
+    moved, missing, pending = 0, [], []
+    for photo_path, variants in retired.items():
+        source = os.path.join(folder, relative_name(photo_path))
+        if not os.path.isfile(source):
+            missing.append(photo_path)
+            continue
+
+        sha256 = hash_file(source)
+        lock(sha256)
+        new_path = place(source, sha256, extension_of(source), keep_source=True)
+        db.session.execute(update(TicketAction).where(TicketAction.photo_path == photo_path).values(
+            photo_path=new_path, photo_sha256=sha256, thumb_path=None, display_path=None
+        ))
+        pending.append(source)
+        pending.extend(os.path.join(folder, relative_name(path)) for path in variants)
+        moved += 1
+
+        if moved % batch_size == 0:
+            _commit_and_remove(pending)
+    _commit_and_remove(pending)
+    return moved, missing
+
+
+def _commit_and_remove(paths):
+    db.session.commit()
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not remove migrated photo {path}: {str(e)}")
+    paths.clear()
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import update
+from app import db, logger
+from app.models import TicketAction
+from app.services.photo_store import URL_PREFIX, relative_name
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Photos are served as uploaded without Pillow
+    Image = None
+
+# Variant -> (longest edge in pixels, encoder quality), largest first so
+# each one is downscaled from the previous
+VARIANTS = {
+    'display': (1600, 80),
+    'thumb': (320, 70),
+}
+
+SAVE_OPTIONS = {
+    'WEBP': {'method': 4},
+    'JPEG': {'optimize': True, 'progressive': True},
+}
+
+
+def variant_name(name, variant, extension):
+    return f"{name}.{variant}.{extension}"
+
+
+def render_variants(folder, name):
+    """Write the variants of the photo `folder/name`; runs in a pool process.
+
+    The EXIF orientation is applied to the pixels and the variants are saved
+    without any metadata, so GPS tags and camera details are dropped.
+    Returns {variant: file name}.
+    """
+    image_format, extension = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+    largest = max(edge for edge, _ in VARIANTS.values())
+    names = {}
+
+    with Image.open(os.path.join(folder, name)) as original:
+        # JPEGs are decoded at a reduced scale straight away when they are much larger
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original).convert('RGB')
+
+    for variant, (edge, quality) in VARIANTS.items():
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        names[variant] = variant_name(name, variant, extension)
+        partial = os.path.join(folder, names[variant] + '.part')
+        image.save(partial, image_format, quality=quality, **SAVE_OPTIONS[image_format])
+        os.replace(partial, os.path.join(folder, names[variant]))
+    return names
+
+
+class PhotoPipeline:
+    """Thumbnail and display-size variants of ticket photos, made off the request path.
+
+    The upload is written as-is and the action committed first; the image
+    work then runs in a process pool of `PHOTO_WORKERS` processes, and the
+    variant paths are stored on every TicketAction sharing the photo when it
+    finishes. Until then, and without Pillow, pages fall back to the original.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('PHOTO_WORKERS', self.workers)
+        app.extensions['photo_pipeline'] = self
+
+    def submit(self, photo_path):
+        """Queue the variants of a stored photo; call after its action has committed"""
+        if Image is None:
+            return
+        name = relative_name(photo_path)
+        try:
+            future = self._pool().submit(render_variants, self.app.config['UPLOAD_FOLDER'], name)
+        except BrokenProcessPool as e:
+            # A pool process died (e.g. killed for memory); start a fresh pool next time
+            logger.error(f"Photo pool unavailable, skipping {name}: {str(e)}")
+            self._executor = None
+            return
+        future.add_done_callback(lambda done: self._record(photo_path, done))
+
+    def process_pending(self):
+        """Queue every photo without variants and wait for them; returns the number queued"""
+        photo_paths = [photo_path for (photo_path,) in db.session.query(TicketAction.photo_path).filter(
+            TicketAction.photo_path.isnot(None),
+            TicketAction.thumb_path.is_(None)
+        ).distinct()]
+        for photo_path in photo_paths:
+            self.submit(photo_path)
+        self.shutdown()
+        return len(photo_paths) if Image is not None else 0
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _pool(self):
+        # Created on first use so every gunicorn worker starts its own after forking;
+        # spawned rather than forked because the worker is multi-threaded
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _record(self, photo_path, future):
+        try:
+            variants = future.result()
+        except Exception as e:
+            logger.error(f"Failed to process photo {photo_path}: {str(e)}")
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None
+            return
+
+        with self.app.app_context():
+            db.session.execute(update(TicketAction).where(TicketAction.photo_path == photo_path).values(
+                thumb_path=f"{URL_PREFIX}/{variants['thumb']}",
+                display_path=f"{URL_PREFIX}/{variants['display']}"
+            ))
+            db.session.commit()
+
+
+photo_pipeline = PhotoPipeline()
@@ -0,0 +1,161 @@
+import csv
+import io
+import re
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from app.models import DailyPlan, PlannedSite, Site
+
+DEFAULT_DURATION = 60
+# Pasted site lines start with the six-character site ID, e.g. "# MDN001 Ganti baterai"
+SITE_ID_LENGTH = 6
+# Upper bound on the planned sites one import may create
+MAX_ROWS = 2000
+
+SITE_MARKERS = ('#', '*', '-')
+ASSIGNEE_PREFIXES = ('bang', 'bg')
+ASSIGNEE_FILLERS = ('bang', 'bg', 'dan')
+# A line holding only a date starts the plan for that date, e.g. "2025-02-24" or "Tanggal: 2025-02-24"
+DATE_LINE = re.compile(r'^(?:date|tanggal)?\s*:?\s*(\d{4}-\d{2}-\d{2})$', re.IGNORECASE)
+
+
+def planned_site(plan_date, site_code, planned_actions, assignee='', visit_order=None, duration=DEFAULT_DURATION):
+    return {
+        'plan_date': plan_date,
+        'site_code': site_code.strip().upper(),
+        'planned_actions': planned_actions,
+        'assignee': assignee,
+        'visit_order': visit_order,
+        'estimated_duration': duration,
+    }
+
+
+def _date(value, line):
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Line {line}: invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _int(value, name, line, default=None):
+    if value is None or not str(value).strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Line {line}: {name} must be a whole number, got '{value}'")
+
+
+def _assignees(line):
+    """'bang @~Andi, @Budi dan Cecep' -> 'Andi, Budi, Cecep'"""
+    words = re.split(r'[\s,]+', line.replace('@~', '@'))
+    names = [word[1:] if word.startswith('@') else word for word in words
+             if word and word != '@' and word.lower() not in ASSIGNEE_FILLERS]
+    return ', '.join(names)
+
+
+def parse_text(text, plan_date):
+    """Planned sites from a pasted plan in the format the create page accepts.
+
+    Lines starting with "bang" or "bg" set the technicians for the sites that
+    follow, and date lines start the plan for another day.
+    """
+    rows = []
+    assignee = ''
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        match = DATE_LINE.match(line)
+        if match:
+            plan_date = _date(match.group(1), number)
+            continue
+        if line.lower().startswith(ASSIGNEE_PREFIXES):
+            assignee = _assignees(line)
+        if line.startswith(SITE_MARKERS):
+            info = line[1:].strip()
+            site_code = info.split(' ')[0][:SITE_ID_LENGTH]
+            actions = info[len(site_code):].strip()
+            if site_code and actions:
+                rows.append(planned_site(plan_date, site_code, actions, assignee))
+    return rows
+
+
+def parse_csv(text, plan_date):
+    """Planned sites from CSV with a header row.
+
+    site_id and planned_actions are required; plan_date, assignee,
+    visit_order and duration are optional.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = {'site_id', 'planned_actions'} - set(reader.fieldnames)
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    rows = []
+    for record in reader:
+        line = reader.line_num
+        if not (record.get('site_id') or '').strip():
+            continue
+        rows.append(planned_site(
+            _date(record['plan_date'], line) if (record.get('plan_date') or '').strip() else plan_date,
+            record['site_id'],
+            (record.get('planned_actions') or '').strip(),
+            (record.get('assignee') or '').strip(),
+            _int(record.get('visit_order'), 'visit_order', line),
+            _int(record.get('duration'), 'duration', line, DEFAULT_DURATION)
+        ))
+    return rows
+
+
+def is_csv(text):
+    header = next((line for line in text.splitlines() if line.strip()), '')
+    return ',' in header and 'site_id' in header.lower()
+
+
+def parse(text, plan_date):
+    """Planned sites from pasted text or CSV, with visit orders filled in per date"""
+    rows = parse_csv(text, plan_date) if is_csv(text) else parse_text(text, plan_date)
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"At most {MAX_ROWS} planned sites can be imported at once")
+
+    # Sites without an explicit order are visited in the order they were listed
+    next_order = {}
+    for row in rows:
+        if row['visit_order'] is None:
+            row['visit_order'] = next_order.get(row['plan_date'], 0) + 1
+        next_order[row['plan_date']] = max(next_order.get(row['plan_date'], 0), row['visit_order'])
+    return rows
+
+
+def resolve_sites(rows):
+    """({site code: sites.id}, sorted unknown codes) for every site in `rows`, with one IN query"""
+    codes = {row['site_code'] for row in rows}
+    if not codes:
+        return {}, []
+    site_ids = dict(db.session.query(Site.site_id, Site.id).filter(Site.site_id.in_(codes)).all())
+    return site_ids, sorted(codes - set(site_ids))
+
+
+def create_plans(user_id, rows, site_ids, status, plan_dates=()):
+    """Add one DailyPlan per date and all their PlannedSites in the caller's transaction.
+
+    Plans are created for every date in `rows` and `plan_dates`. Rows whose
+    site code is not in `site_ids` are skipped. The planned sites go in as one
+    executemany INSERT. Returns the plans ordered by date.
+    """
+    dates = sorted(set(plan_dates) | {row['plan_date'] for row in rows})
+    plans = {plan_date: DailyPlan(enom_user_id=user_id, plan_date=plan_date, status=status) for plan_date in dates}
+    db.session.add_all(plans.values())
+    db.session.flush()
+
+    values = [{
+        'daily_plan_id': plans[row['plan_date']].id,
+        'site_id': site_ids[row['site_code']],
+        'planned_actions': row['planned_actions'],
+        'visit_order': row['visit_order'],
+        'estimated_duration': row['estimated_duration'],
+        'assignee': row['assignee'],
+    } for row in rows if row['site_code'] in site_ids]
+    if values:
+        db.session.execute(insert(PlannedSite), values)
+    return [plans[plan_date] for plan_date in dates]
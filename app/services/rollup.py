@@ -0,0 +1,115 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import String, cast, delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models import Ticket, TicketDailyStat
+from app.services.tz import jakarta_date, to_utc
+
+KEY_COLUMNS = ('stat_date', 'site_id', 'problem_category', 'assigned_to_enom', 'status')
+
+TicketSnapshot = namedtuple('TicketSnapshot', KEY_COLUMNS + ('closed_seconds',))
+
+
+def _name(value):
+    if value is None:
+        return ''
+    if isinstance(value, Enum):
+        return value.name
+    return str(value)
+
+
+def snapshot(ticket):
+    """Capture the rollup key and measures of a ticket in its current state"""
+    created_at = ticket.created_at or datetime.utcnow()
+    closed_seconds = None
+    if ticket.closed_at is not None:
+        closed_seconds = (to_utc(ticket.closed_at) - to_utc(created_at)).total_seconds()
+
+    return TicketSnapshot(
+        stat_date=jakarta_date(created_at),
+        site_id=int(ticket.site_id),
+        problem_category=_name(ticket.problem_category),
+        assigned_to_enom=_name(ticket.assigned_to_enom),
+        status=_name(ticket.status),
+        closed_seconds=closed_seconds
+    )
+
+
+def record(before=(), after=()):
+    """Move tickets from their `before` snapshots to their `after` snapshots.
+
+    Runs as one upsert in the caller's transaction, so the rollup commits or
+    rolls back together with the ticket change itself.
+    """
+    deltas = {}
+    for snapshots, sign in ((before, -1), (after, 1)):
+        for snap in snapshots:
+            if snap is None:
+                continue
+            delta = deltas.setdefault(snap[:len(KEY_COLUMNS)], [0, 0, 0.0])
+            delta[0] += sign
+            if snap.closed_seconds is not None:
+                delta[1] += sign
+                delta[2] += sign * snap.closed_seconds
+
+    rows = [
+        dict(zip(KEY_COLUMNS, key),
+             ticket_count=count,
+             closed_count=closed,
+             closed_seconds=seconds)
+        for key, (count, closed, seconds) in sorted(deltas.items())
+        if count or closed or seconds
+    ]
+    if not rows:
+        return
+
+    stmt = pg_insert(TicketDailyStat).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            'ticket_count': TicketDailyStat.ticket_count + stmt.excluded.ticket_count,
+            'closed_count': TicketDailyStat.closed_count + stmt.excluded.closed_count,
+            'closed_seconds': TicketDailyStat.closed_seconds + stmt.excluded.closed_seconds,
+        }
+    )
+    db.session.execute(stmt)
+
+
+@contextmanager
+def track(ticket):
+    """Record whatever the body of the `with` block changes on `ticket`"""
+    before = snapshot(ticket)
+    yield
+    record(before=[before], after=[snapshot(ticket)])
+
+
+def rebuild():
+    """Recompute the whole rollup from the tickets table in one transaction"""
+    # Writers upserting into the rollup wait until the rebuild has committed
+    db.session.execute(text('LOCK TABLE ticket_daily_stats IN EXCLUSIVE MODE'))
+    db.session.execute(delete(TicketDailyStat))
+
+    dimensions = [
+        Ticket.local_date,
+        Ticket.site_id,
+        func.coalesce(cast(Ticket.problem_category, String), ''),
+        func.coalesce(cast(Ticket.assigned_to_enom, String), ''),
+        func.coalesce(cast(Ticket.status, String), ''),
+    ]
+    source = select(
+        *dimensions,
+        func.count(Ticket.id),
+        func.count(Ticket.closed_at),
+        func.coalesce(func.sum(func.extract('epoch', Ticket.closed_at - Ticket.created_at)), 0)
+    ).group_by(*dimensions)
+
+    db.session.execute(insert(TicketDailyStat).from_select(
+        list(KEY_COLUMNS) + ['ticket_count', 'closed_count', 'closed_seconds'],
+        source
+    ))
+    db.session.commit()
+
+    return db.session.query(func.count()).select_from(TicketDailyStat).scalar()
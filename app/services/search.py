@@ -0,0 +1,132 @@
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import Integer, cast, false, func, literal, null, or_, select, union_all
+from app import db
+from app.models import DailyPlan, PlannedSite, Site, Ticket, TicketAction
+
+# Text search configuration of the generated search_vector columns
+TS_CONFIG = 'simple'
+
+# ts_headline wraps matches in these; they are swapped for <mark> after escaping
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+HEADLINE_OPTIONS = f'StartSel={START_SEL}, StopSel={STOP_SEL}, MaxWords=30, MinWords=10, MaxFragments=2'
+
+
+def prefix_query(text):
+    """to_tsquery text matching every word of `text` as a prefix, or None.
+
+    Words are reduced to letters and digits first, so user input can never
+    reach the tsquery parser as operators.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return ' & '.join(f"{word}:*" for word in words[:8])
+
+
+def ticket_filter(text):
+    """Search predicate for the ticket list: full text, or partial number / creator"""
+    pattern = f"%{text}%"
+    conditions = [Ticket.ticket_number.ilike(pattern), Ticket.created_by.ilike(pattern)]
+    tsquery = prefix_query(text)
+    if tsquery:
+        conditions.append(Ticket.search_vector.op('@@')(func.to_tsquery(TS_CONFIG, tsquery)))
+    return or_(*conditions)
+
+
+def highlight(headline):
+    """Escape a ts_headline fragment and turn its match markers into <mark>"""
+    text = str(escape(headline or ''))
+    return Markup(text.replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
+
+
+def search(text, enom_assignee=None, enom_user_id=None, limit=20, offset=0):
+    """Ranked matches across tickets, ticket actions and planned sites.
+
+    Each source is matched through its GIN-indexed search_vector (tickets
+    also by partial ticket number through the trigram index), ranked with
+    ts_rank_cd and merged in one UNION ALL. Headlines are only computed for
+    the page of results that is returned. ENOM users pass their user id and
+    EnomAssignee (None when their username maps to none) and only see their
+    own tickets and plans.
+    """
+    tsquery = prefix_query(text)
+    if tsquery is None:
+        return []
+    query = func.to_tsquery(TS_CONFIG, tsquery)
+
+    ticket_match = Ticket.search_vector.op('@@')(query)
+    tickets = select(
+        literal('ticket').label('kind'),
+        Ticket.id.label('ticket_id'),
+        cast(null(), Integer).label('plan_id'),
+        Ticket.ticket_number.label('title'),
+        Ticket.description.label('body'),
+        func.greatest(
+            func.ts_rank_cd(Ticket.search_vector, query),
+            func.similarity(Ticket.ticket_number, text)
+        ).label('rank'),
+        Ticket.created_at.label('created_at')
+    ).where(
+        or_(ticket_match, Ticket.ticket_number.ilike(f"%{text}%"))
+    )
+
+    actions = select(
+        literal('action').label('kind'),
+        Ticket.id.label('ticket_id'),
+        cast(null(), Integer).label('plan_id'),
+        Ticket.ticket_number.label('title'),
+        TicketAction.action_text.label('body'),
+        func.ts_rank_cd(TicketAction.search_vector, query).label('rank'),
+        TicketAction.created_at.label('created_at')
+    ).join(
+        Ticket, Ticket.id == TicketAction.ticket_id
+    ).where(TicketAction.search_vector.op('@@')(query))
+
+    planned = select(
+        literal('plan').label('kind'),
+        cast(null(), Integer).label('ticket_id'),
+        DailyPlan.id.label('plan_id'),
+        (Site.site_id + literal(' - ') + Site.name).label('title'),
+        func.concat_ws('\n', PlannedSite.planned_actions, PlannedSite.updated_actions).label('body'),
+        func.ts_rank_cd(PlannedSite.search_vector, query).label('rank'),
+        DailyPlan.created_at.label('created_at')
+    ).join(
+        DailyPlan, DailyPlan.id == PlannedSite.daily_plan_id
+    ).join(
+        Site, Site.id == PlannedSite.site_id
+    ).where(PlannedSite.search_vector.op('@@')(query))
+
+    if enom_user_id is not None:
+        own_ticket = Ticket.assigned_to_enom == enom_assignee if enom_assignee else false()
+        tickets = tickets.where(own_ticket)
+        actions = actions.where(own_ticket)
+        planned = planned.where(DailyPlan.enom_user_id == enom_user_id)
+
+    matches = union_all(tickets, actions, planned).subquery()
+    top = select(matches).order_by(
+        matches.c.rank.desc(), matches.c.created_at.desc()
+    ).limit(limit).offset(offset).subquery()
+
+    rows = db.session.execute(
+        select(
+            top.c.kind,
+            top.c.ticket_id,
+            top.c.plan_id,
+            top.c.title,
+            top.c.rank,
+            top.c.created_at,
+            func.ts_headline(TS_CONFIG, top.c.body, query, HEADLINE_OPTIONS).label('headline')
+        ).order_by(top.c.rank.desc(), top.c.created_at.desc())
+    ).all()
+
+    return [{
+        'kind': row.kind,
+        'ticket_id': row.ticket_id,
+        'plan_id': row.plan_id,
+        'title': row.title,
+        'rank': float(row.rank),
+        'created_at': row.created_at,
+        'headline': highlight(row.headline)
+    } for row in rows]
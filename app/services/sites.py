@@ -0,0 +1,150 @@
+import threading
+import time
+from markupsafe import Markup, escape
+from sqlalchemy import event, text
+from app import db, logger
+from app.models import Site
+
+# Option label styles: "MDN001 - Medan Kota" for pickers, the bare name for filters
+CODE_LABEL = 'code'
+NAME_LABEL = 'name'
+
+
+class SiteRecord:
+    """Read-only copy of one sites row"""
+
+    __slots__ = ('id', 'site_id', 'name', 'tower_owner', 'kabupaten', 'long', 'lat')
+
+    def __init__(self, id, site_id, name, tower_owner, kabupaten, long, lat):
+        self.id = id
+        self.site_id = site_id
+        self.name = name
+        self.tower_owner = tower_owner
+        self.kabupaten = kabupaten
+        self.long = long
+        self.lat = lat
+
+
+class _Options:
+    """Pre-rendered <option> list that can mark one site selected without re-rendering"""
+
+    __slots__ = ('html', 'offsets', 'selected')
+
+    def __init__(self, rendered, selected):
+        self.html = ''.join(rendered)
+        self.selected = selected
+        self.offsets = [0]
+        for option in rendered:
+            self.offsets.append(self.offsets[-1] + len(option))
+
+    def render(self, position):
+        if position is None:
+            return Markup(self.html)
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return Markup(self.html[:start] + self.selected[position] + self.html[end:])
+
+
+class SiteSnapshot:
+    """Immutable view of the sites table at one version, ordered by site_id"""
+
+    def __init__(self, version, records):
+        self.version = version
+        self.records = tuple(records)
+        self._positions = {record.id: position for position, record in enumerate(self.records)}
+        self._options = {
+            CODE_LABEL: self._render(lambda r: f"{r.site_id} - {r.name}", with_name=True),
+            NAME_LABEL: self._render(lambda r: r.name)
+        }
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, site_id):
+        position = self._positions.get(site_id)
+        return None if position is None else self.records[position]
+
+    def options(self, selected=None, label=CODE_LABEL):
+        """<option> tags for every site, with the site whose id is `selected` preselected"""
+        return self._options[label].render(self._positions.get(selected))
+
+    def _render(self, label, with_name=False):
+        rendered, selected = [], []
+        for record in self.records:
+            attrs = f' data-name="{escape(record.name)}"' if with_name else ''
+            opening = f'<option value="{record.id}"{attrs}'
+            body = f'>{escape(label(record))}</option>'
+            rendered.append(opening + body)
+            selected.append(opening + ' selected' + body)
+        return _Options(rendered, selected)
+
+
+class SiteCatalog:
+    """Per-worker snapshot of the sites table shared by all requests.
+
+    Pages that list sites render from the snapshot instead of loading every
+    Site as an ORM object. Writes made through this process mark it stale
+    right away; writes from other workers and imports are picked up from the
+    table's counters in pg_stat_user_tables, checked at most every
+    `SITE_CATALOG_CHECK_SECONDS`. Each reload gets a new version number.
+    """
+
+    def __init__(self):
+        self.check_interval = 30
+        self._snapshot = None
+        self._signature = None
+        self._checked_at = 0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.check_interval = app.config.get('SITE_CATALOG_CHECK_SECONDS', self.check_interval)
+        app.extensions['site_catalog'] = self
+
+    def mark_stale(self, *args):
+        self._stale = True
+
+    def snapshot(self):
+        if not self._is_due():
+            return self._snapshot
+
+        with self._lock:
+            if self._is_due():
+                signature = self._table_signature()
+                if self._snapshot is None or self._stale or signature != self._signature:
+                    # Cleared first so a write landing during the reload marks it stale again
+                    self._stale = False
+                    self._snapshot = self._load()
+                self._signature = signature
+                self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def _load(self):
+        started = time.perf_counter()
+        rows = db.session.query(
+            Site.id, Site.site_id, Site.name, Site.tower_owner, Site.kabupaten, Site.long, Site.lat
+        ).order_by(Site.site_id).all()
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        snapshot = SiteSnapshot(version, (SiteRecord(*row) for row in rows))
+        logger.info(f"Loaded site catalog v{version} with {len(snapshot)} sites in "
+                    f"{(time.perf_counter() - started) * 1000:.1f}ms")
+        return snapshot
+
+    def _is_due(self):
+        return (self._snapshot is None or self._stale
+                or time.monotonic() - self._checked_at >= self.check_interval)
+
+    def _table_signature(self):
+        # n_live_tup also moves on TRUNCATE, which the tuple counters miss
+        return tuple(db.session.execute(text(
+            "SELECT n_tup_ins, n_tup_upd, n_tup_del, n_live_tup "
+            "FROM pg_stat_user_tables WHERE relid = CAST('sites' AS regclass)"
+        )).one())
+
+
+site_catalog = SiteCatalog()
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Site, _event, site_catalog.mark_stale)
@@ -0,0 +1,61 @@
+import threading
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models import TicketNumberCounter
+from app.services.tz import jakarta_now
+
+PREFIX = 'TKT'
+# Digits the daily counter is padded to; busier days simply get longer numbers
+DIGITS = 4
+
+
+def format_number(day, value):
+    return f"{PREFIX}-{day.strftime('%Y%m%d')}-{value:0{DIGITS}d}"
+
+
+class TicketNumberAllocator:
+    """Hands out ticket numbers like TKT-20250221-0007 from a per-day counter.
+
+    Each worker reserves `TICKET_NUMBER_BLOCK_SIZE` numbers at a time with one
+    upsert on ticket_number_counters, run and committed on its own connection
+    so the counter row is locked only for that statement, never for the
+    ticket's transaction. Numbers are then taken from memory without touching
+    the database. Numbers are unique without any retry; the cost is that they
+    are not strictly in creation order across workers, and a block left
+    unused when a worker stops leaves a gap.
+    """
+
+    def __init__(self):
+        self.block_size = 10
+        self._day = None
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.block_size = app.config.get('TICKET_NUMBER_BLOCK_SIZE', self.block_size)
+        app.extensions['ticket_numbers'] = self
+
+    def allocate(self, now=None):
+        day = (now or jakarta_now()).date()
+        with self._lock:
+            if day != self._day or self._next > self._end:
+                end = self._reserve(day)
+                # Only once the block is ours, so a failed reservation leaves the old state whole
+                self._day, self._end, self._next = day, end, end - self.block_size + 1
+            value = self._next
+            self._next += 1
+        return format_number(day, value)
+
+    def _reserve(self, day):
+        """Reserve the next block for `day`; returns its last number"""
+        statement = pg_insert(TicketNumberCounter).values(day=day, last_value=self.block_size)
+        statement = statement.on_conflict_do_update(
+            index_elements=[TicketNumberCounter.day],
+            set_={'last_value': TicketNumberCounter.last_value + self.block_size}
+        ).returning(TicketNumberCounter.last_value)
+        with db.engine.begin() as connection:
+            return connection.execute(statement).scalar_one()
+
+
+ticket_numbers = TicketNumberAllocator()
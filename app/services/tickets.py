@@ -0,0 +1,141 @@
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Site, Ticket, TicketAction, User
+from app.services.pagination import keyset_paginate
+from app.services.tz import to_jakarta
+
+PREVIEW_LENGTH = 120
+# Actions shown per timeline page on the ticket detail page
+TIMELINE_PAGE_SIZE = 20
+
+Creator = aliased(User)
+Assignee = aliased(User)
+
+# Columns the ticket list shows; created_at and id also feed the keyset cursor
+LIST_COLUMNS = (
+    Ticket.id,
+    Ticket.ticket_number,
+    Ticket.site_id,
+    Site.site_id.label('site_code'),
+    Site.name.label('site_name'),
+    Ticket.problem_category,
+    Ticket.status,
+    Ticket.assigned_to_enom,
+    Ticket.created_at,
+    Ticket.closed_at,
+    # One extra character tells whether the preview was cut
+    func.substr(Ticket.description, 1, PREVIEW_LENGTH + 1).label('description_preview')
+)
+
+DETAIL_COLUMNS = (
+    Ticket.id,
+    Ticket.ticket_number,
+    Ticket.site_id,
+    Site.site_id.label('site_code'),
+    Site.name.label('site_name'),
+    Ticket.problem_category,
+    Ticket.status,
+    Ticket.description,
+    Ticket.created_by,
+    Creator.username.label('creator_name'),
+    Ticket.assigned_to_id,
+    Assignee.username.label('assignee_name'),
+    Ticket.assigned_to_enom,
+    Ticket.created_at,
+    Ticket.resolved_at,
+    Ticket.closed_at
+)
+
+ACTION_COLUMNS = (
+    TicketAction.id,
+    TicketAction.action_text,
+    TicketAction.photo_path,
+    TicketAction.thumb_path,
+    TicketAction.display_path,
+    TicketAction.created_by,
+    User.username.label('user_name'),
+    TicketAction.created_at
+)
+
+
+class TicketRow:
+    """Read-only ticket fields for the list and detail pages.
+
+    Fields that were not projected are None. Timestamps are also exposed in
+    Jakarta time under the same names as the Ticket properties.
+    """
+
+    __slots__ = (
+        'id', 'ticket_number', 'site_id', 'site_code', 'site_name', 'problem_category', 'status',
+        'description', 'description_preview', 'created_by', 'creator_name', 'assigned_to_id',
+        'assignee_name', 'assigned_to_enom', 'created_at', 'resolved_at', 'closed_at',
+        'created_at_jakarta', 'resolved_at_jakarta', 'closed_at_jakarta'
+    )
+
+    def __init__(self, fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        self.created_at_jakarta = to_jakarta(self.created_at)
+        self.resolved_at_jakarta = to_jakarta(self.resolved_at)
+        self.closed_at_jakarta = to_jakarta(self.closed_at)
+        if self.description_preview and len(self.description_preview) > PREVIEW_LENGTH:
+            self.description_preview = self.description_preview[:PREVIEW_LENGTH].rstrip() + '…'
+
+
+class ActionRow:
+    """Read-only ticket action for the update history"""
+
+    __slots__ = (
+        'id', 'action_text', 'photo_path', 'thumb_path', 'display_path', 'created_by', 'user_name',
+        'created_at', 'created_at_jakarta'
+    )
+
+    def __init__(self, fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        self.created_at_jakarta = to_jakarta(self.created_at)
+
+
+def list_query(query):
+    """Project a filtered Ticket query onto the list columns, joined to its site"""
+    return query.with_entities(*LIST_COLUMNS).join(Site, Site.id == Ticket.site_id)
+
+
+def ticket_rows(rows):
+    return [TicketRow(row._mapping) for row in rows]
+
+
+def ticket_detail(ticket_id):
+    """TicketRow with site and user names for the detail page, or None"""
+    row = db.session.query(*DETAIL_COLUMNS).join(
+        Site, Site.id == Ticket.site_id
+    ).outerjoin(
+        Creator, Creator.id == Ticket.created_by_id
+    ).outerjoin(
+        Assignee, Assignee.id == Ticket.assigned_to_id
+    ).filter(Ticket.id == ticket_id).first()
+    return TicketRow(row._mapping) if row else None
+
+
+def _action_query():
+    return db.session.query(*ACTION_COLUMNS).outerjoin(User, User.id == TicketAction.created_by_id)
+
+
+def ticket_actions(ticket_id, cursor=None, per_page=TIMELINE_PAGE_SIZE):
+    """One KeysetPage of a ticket's ActionRows, newest first.
+
+    Served by the (ticket_id, created_at, id) index; raises ValueError for a
+    malformed cursor.
+    """
+    page = keyset_paginate(
+        _action_query().filter(TicketAction.ticket_id == ticket_id), TicketAction, per_page, cursor
+    )
+    page.items = [ActionRow(row._mapping) for row in page.items]
+    return page
+
+
+def ticket_action(action_id):
+    """ActionRow for a single action, or None"""
+    row = _action_query().filter(TicketAction.id == action_id).first()
+    return ActionRow(row._mapping) if row else None
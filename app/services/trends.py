@@ -0,0 +1,76 @@
+from datetime import datetime, time
+from sqlalchemy import Date, DateTime, cast, func, literal_column, select
+from app import db
+from app.models import Site, TicketDailyStat
+
+BUCKETS = ('day', 'week', 'month')
+
+# Longer series are downsampled to a coarser bucket
+MAX_POINTS = 120
+
+
+def bucket_count(start, end, bucket):
+    days = (end - start).days + 1
+    if bucket == 'day':
+        return days
+    if bucket == 'week':
+        return days // 7 + 2
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def effective_bucket(start, end, bucket):
+    """The finest bucket, no finer than requested, that fits in MAX_POINTS"""
+    for candidate in BUCKETS[BUCKETS.index(bucket):]:
+        if bucket_count(start, end, candidate) <= MAX_POINTS:
+            return candidate
+    return BUCKETS[-1]
+
+
+def ticket_trend(start, end, bucket='day', category=None, site_id=None, kabupaten=None, assignee=None):
+    """New tickets per Jakarta day, week or month between `start` and `end`.
+
+    Produced by a single statement: generate_series lays out every bucket and
+    is left-joined to the ticket_daily_stats rollup grouped by bucket, so
+    empty buckets come back as zero. Returns (bucket, labels, counts).
+    """
+    bucket = effective_bucket(start, end, bucket)
+    step = literal_column(f"interval '1 {bucket}'")
+
+    bucket_start = cast(func.date_trunc(bucket, cast(TicketDailyStat.stat_date, DateTime)), Date)
+    counts = select(
+        bucket_start.label('bucket'),
+        func.sum(TicketDailyStat.ticket_count).label('tickets')
+    ).where(
+        TicketDailyStat.stat_date >= start,
+        TicketDailyStat.stat_date <= end
+    )
+    if category:
+        counts = counts.where(TicketDailyStat.problem_category == category)
+    if site_id:
+        counts = counts.where(TicketDailyStat.site_id == site_id)
+    if kabupaten:
+        counts = counts.where(TicketDailyStat.site_id.in_(
+            select(Site.id).where(Site.kabupaten == kabupaten)
+        ))
+    if assignee:
+        counts = counts.where(TicketDailyStat.assigned_to_enom == assignee)
+    counts = counts.group_by(bucket_start).subquery()
+
+    series = select(
+        cast(func.generate_series(
+            func.date_trunc(bucket, datetime.combine(start, time.min)),
+            datetime.combine(end, time.min),
+            step
+        ), Date).label('bucket')
+    ).subquery()
+
+    rows = db.session.execute(
+        select(
+            series.c.bucket,
+            func.coalesce(counts.c.tickets, 0)
+        ).outerjoin(
+            counts, counts.c.bucket == series.c.bucket
+        ).order_by(series.c.bucket)
+    ).all()
+
+    return bucket, [row[0].isoformat() for row in rows], [int(row[1]) for row in rows]
@@ -0,0 +1,27 @@
+import pytz
+from datetime import datetime
+
+JAKARTA_TZ = pytz.timezone('Asia/Jakarta')
+
+
+def jakarta_now():
+    return datetime.now(JAKARTA_TZ)
+
+
+def jakarta_today():
+    return jakarta_now().date()
+
+
+def to_utc(dt):
+    """Aware UTC datetime; naive values are stored in UTC by the database"""
+    if dt.tzinfo is None:
+        return pytz.utc.localize(dt)
+    return dt.astimezone(pytz.utc)
+
+
+def jakarta_date(dt):
+    return to_utc(dt).astimezone(JAKARTA_TZ).date()
+
+
+def to_jakarta(dt):
+    return to_utc(dt).astimezone(JAKARTA_TZ) if dt else None
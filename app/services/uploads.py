@@ -0,0 +1,164 @@
+import fcntl
+import json
+import os
+import re
+import secrets
+import time
+from flask import current_app
+from app import logger
+from app.services import photo_store
+
+# Upload ids come from secrets.token_urlsafe(16)
+UPLOAD_ID = re.compile(r'^[A-Za-z0-9_-]{22}$')
+COPY_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A resumable upload request that cannot be applied, with its HTTP status"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _path(upload_id, suffix):
+    return os.path.join(photo_store.incoming_dir(), f"{upload_id}.{suffix}")
+
+
+def _load(upload_id, user_id):
+    """Metadata of an upload owned by `user_id`; anything else is reported as not found"""
+    if not UPLOAD_ID.match(upload_id or ''):
+        raise UploadError('Upload not found', 404)
+    try:
+        with open(_path(upload_id, 'json')) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404)
+    if meta['user_id'] != user_id:
+        raise UploadError('Upload not found', 404)
+    return meta
+
+
+def _locked(f):
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise UploadError('Another request is writing this upload', 409, os.fstat(f.fileno()).st_size)
+
+
+def initiate(user_id, filename, size):
+    """Start an upload of `size` bytes; returns its id"""
+    try:
+        extension = photo_store.allowed_extension(filename)
+    except ValueError as e:
+        raise UploadError(str(e))
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    if size > current_app.config['PHOTO_UPLOAD_MAX_SIZE']:
+        raise UploadError(f"Photos can be at most {current_app.config['PHOTO_UPLOAD_MAX_SIZE']} bytes", 413)
+
+    upload_id = secrets.token_urlsafe(16)
+    open(_path(upload_id, 'part'), 'xb').close()
+    with open(_path(upload_id, 'json'), 'x') as f:
+        json.dump({'user_id': user_id, 'extension': extension, 'size': size}, f)
+    return upload_id
+
+
+def status(upload_id, user_id):
+    """(bytes received, total size) of an upload"""
+    meta = _load(upload_id, user_id)
+    return os.path.getsize(_path(upload_id, 'part')), meta['size']
+
+
+def append(upload_id, user_id, offset, stream):
+    """Write the request body `stream` at `offset`; returns the new offset.
+
+    The body is copied to disk as it arrives, so a dropped connection keeps
+    every byte received before it; the client asks for the offset and
+    continues from there. A chunk that starts anywhere but the current end
+    of the upload is rejected with 409 and the current offset.
+    """
+    meta = _load(upload_id, user_id)
+    try:
+        # Never recreates the part file of an upload finalized in the meantime
+        f = open(_path(upload_id, 'part'), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404)
+    with f:
+        _locked(f)
+        # finalize() removes the metadata while holding the lock
+        if not os.path.exists(_path(upload_id, 'json')):
+            raise UploadError('Upload not found', 404)
+        received = f.seek(0, os.SEEK_END)
+        if offset != received:
+            raise UploadError('Offset does not match the bytes received', 409, received)
+        # Keeps an upload that is still progressing away from the garbage collector
+        os.utime(_path(upload_id, 'json'))
+
+        for chunk in iter(lambda: stream.read(COPY_SIZE), b''):
+            if received + len(chunk) > meta['size']:
+                f.truncate(offset)
+                raise UploadError('Chunk runs past the declared size', 413, offset)
+            f.write(chunk)
+            received += len(chunk)
+    return received
+
+
+def finalize(upload_id, user_id):
+    """Move a complete upload into the photo store; returns (photo_path, sha256).
+
+    Like photo_store.store(), the hash stays locked until the caller's
+    transaction ends. The metadata is removed under the upload's file lock
+    before the file is moved, so a chunk that arrives meanwhile finds the
+    upload gone. If moving fails, the part file is left for collect_garbage().
+    """
+    meta = _load(upload_id, user_id)
+    part = _path(upload_id, 'part')
+    try:
+        f = open(part, 'rb')
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404)
+    with f:
+        _locked(f)
+        received = os.fstat(f.fileno()).st_size
+        if received != meta['size']:
+            raise UploadError('Upload is not complete', 409, received)
+        try:
+            os.unlink(_path(upload_id, 'json'))
+        except FileNotFoundError:
+            # Finalized by a concurrent request
+            raise UploadError('Upload not found', 404)
+        sha256 = photo_store.hash_file(part)
+        photo_store.lock(sha256)
+        photo_path = photo_store.place(part, sha256, meta['extension'])
+    return photo_path, sha256
+
+
+def discard(upload_id, user_id):
+    _load(upload_id, user_id)
+    for suffix in ('part', 'json'):
+        try:
+            os.unlink(_path(upload_id, suffix))
+        except FileNotFoundError:
+            pass
+
+
+def collect_garbage(max_age):
+    """Remove incoming files untouched for `max_age` seconds; returns how many.
+
+    Covers abandoned resumable uploads and spool files left by interrupted
+    direct uploads.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in list(os.scandir(photo_store.incoming_dir())):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not remove stale upload {entry.name}: {str(e)}")
+    return removed
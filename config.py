@@ -32,6 +32,13 @@ class Config:
     UPLOAD_FOLDER = '/var/www/uploads/enom_tracker'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    PHOTO_WORKERS = 2  # Processes per app worker making photo thumbnails and display copies
+    # nginx internal location aliasing UPLOAD_FOLDER, e.g. /protected-uploads; unset serves photos from Flask
+    PHOTO_ACCEL_REDIRECT_PREFIX = os.getenv('PHOTO_ACCEL_REDIRECT_PREFIX')
+    # Resumable photo uploads
+    PHOTO_UPLOAD_MAX_SIZE = 32 * 1024 * 1024  # Whole photo; each chunk is still capped by MAX_CONTENT_LENGTH
+    PHOTO_UPLOAD_CHUNK_SIZE = 1024 * 1024  # Suggested to clients; a dropped chunk costs at most this much
+    PHOTO_UPLOAD_EXPIRY_HOURS = 24  # Unfinished uploads older than this are removed by `flask gc-uploads`
 
     # Flask security configuration
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY')
@@ -65,10 +72,26 @@ class Config:
         "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
     }
 
+    # Redis, shared by the dashboard cache and live events
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    DASHBOARD_CACHE_SIZE = 256  # Entries kept in the per-worker fallback LRU
+    DASHBOARD_CACHE_LOCAL_TTL = 10  # Seconds a fallback entry is served; other workers' invalidations don't reach it
+
+    # Live updates over Server-Sent Events
+    EVENT_BROKER = os.getenv('EVENT_BROKER', 'redis')  # 'redis', or 'local' for a single worker
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_STREAM_SECONDS = 300  # Streams end after this and the browser reconnects
+
+    # Ticket numbers each worker reserves from the day's counter at once; 1 keeps them in creation order
+    TICKET_NUMBER_BLOCK_SIZE = 10
+
+    # Site catalog and autocomplete index; how often each worker checks the sites table for changes
+    SITE_CATALOG_CHECK_SECONDS = 30
+
     # Rate limiting
     RATELIMIT_ENABLED = True
     RATELIMIT_DEFAULT = "100 per hour"
-    RATELIMIT_STORAGE_URL = "memory://"
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'redis://localhost:6379')
 
     # Flask configuration
     TEMPLATES_AUTO_RELOAD = True
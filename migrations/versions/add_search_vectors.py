@@ -0,0 +1,58 @@
+"""add full-text search vectors and trigram indexes
+
+Revision ID: add_search_vectors
+Revises: add_tickets_created_at_id_index
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_vectors'
+down_revision = 'add_tickets_created_at_id_index'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTORS = {
+    'tickets': (
+        "setweight(to_tsvector('simple', coalesce(ticket_number, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+    ),
+    'ticket_actions': "to_tsvector('simple', coalesce(action_text, ''))",
+    'planned_sites': (
+        "setweight(to_tsvector('simple', coalesce(planned_actions, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(updated_actions, '')), 'B')"
+    ),
+}
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Generated columns are filled for existing rows when they are added and
+    # kept current by Postgres on every insert and update afterwards
+    for table, expression in SEARCH_VECTORS.items():
+        op.execute(f"""
+            ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS ({expression}) STORED
+        """)
+
+    with op.get_context().autocommit_block():
+        for table in SEARCH_VECTORS:
+            op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+        for column in ('ticket_number', 'created_by'):
+            op.create_index(f'ix_tickets_{column}_trgm', 'tickets', [column],
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for column in ('ticket_number', 'created_by'):
+            op.drop_index(f'ix_tickets_{column}_trgm', table_name='tickets',
+                          postgresql_concurrently=True, if_exists=True)
+        for table in SEARCH_VECTORS:
+            op.drop_index(f'ix_{table}_search_vector', table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
+
+    for table in SEARCH_VECTORS:
+        op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
@@ -0,0 +1,27 @@
+"""add ticket_actions photo_sha256 for the content-addressed photo store
+
+Revision ID: add_ticket_action_photo_sha256
+Revises: add_ticket_action_photo_variants
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_action_photo_sha256'
+down_revision = 'add_ticket_action_photo_variants'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Existing photos are hashed and moved by `flask migrate-photos`
+    op.add_column('ticket_actions', sa.Column('photo_sha256', sa.String(64), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_ticket_actions_photo_sha256', 'ticket_actions', ['photo_sha256'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_ticket_actions_photo_sha256', table_name='ticket_actions',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('ticket_actions', 'photo_sha256')
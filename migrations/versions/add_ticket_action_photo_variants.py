@@ -0,0 +1,23 @@
+"""add ticket_actions thumb_path and display_path for photo variants
+
+Revision ID: add_ticket_action_photo_variants
+Revises: add_ticket_actions_timeline_index
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_action_photo_variants'
+down_revision = 'add_ticket_actions_timeline_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Existing photos get their variants from `flask process-photos`
+    op.add_column('ticket_actions', sa.Column('thumb_path', sa.String(255), nullable=True))
+    op.add_column('ticket_actions', sa.Column('display_path', sa.String(255), nullable=True))
+
+def downgrade():
+    op.drop_column('ticket_actions', 'display_path')
+    op.drop_column('ticket_actions', 'thumb_path')
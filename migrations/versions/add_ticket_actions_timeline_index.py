@@ -0,0 +1,25 @@
+"""add ticket_actions (ticket_id, created_at, id) index for the paged timeline
+
+Revision ID: add_ticket_actions_timeline_index
+Revises: add_search_vectors
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_actions_timeline_index'
+down_revision = 'add_search_vectors'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Serves each "load older" page of a ticket's timeline as one range scan
+    with op.get_context().autocommit_block():
+        op.create_index('ix_ticket_actions_ticket_id_created_at_id', 'ticket_actions',
+                        ['ticket_id', 'created_at', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_ticket_actions_ticket_id_created_at_id', table_name='ticket_actions',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""add ticket local_date and dashboard indexes
+
+Revision ID: add_ticket_local_date
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_local_date'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_tickets_local_date_status', ['local_date', 'status']),
+    ('ix_tickets_site_id_status', ['site_id', 'status']),
+    ('ix_tickets_assigned_to_enom_status', ['assigned_to_enom', 'status']),
+)
+
+def upgrade():
+    # A stored generated column is computed for every existing row while the
+    # table is rewritten, so no separate backfill pass is needed
+    op.execute("""
+        ALTER TABLE tickets
+        ADD COLUMN IF NOT EXISTS local_date date
+        GENERATED ALWAYS AS ((created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Jakarta')::date) STORED
+    """)
+
+    # Build the indexes without blocking ticket writes
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'tickets', columns, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.drop_index(name, table_name='tickets', postgresql_concurrently=True, if_exists=True)
+
+    op.execute('ALTER TABLE tickets DROP COLUMN IF EXISTS local_date')
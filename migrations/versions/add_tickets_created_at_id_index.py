@@ -0,0 +1,24 @@
+"""add tickets (created_at, id) index for keyset pagination
+
+Revision ID: add_tickets_created_at_id_index
+Revises: add_ticket_local_date
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_tickets_created_at_id_index'
+down_revision = 'add_ticket_local_date'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Serves both directions of the /tickets cursor scan
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tickets_created_at_id', 'tickets', ['created_at', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tickets_created_at_id', table_name='tickets',
+                      postgresql_concurrently=True, if_exists=True)